@@ -2,7 +2,10 @@
 
 import os
 import sys
-import traceback
+
+# Cold starts pay for everything app.main builds at import, so defer what
+# can wait until a request needs it (see app/startup.py).
+os.environ.setdefault("WD_STARTUP", "lazy")
 
 # Try multiple possible locations for the project root.
 # Vercel's Lambda environment may place files differently.
@@ -16,14 +19,18 @@ _candidates = [
 ]
 
 for _path in _candidates:
-    if os.path.isdir(os.path.join(_path, "app")) and _path not in sys.path:
-        sys.path.insert(0, _path)
+    if os.path.isdir(os.path.join(_path, "app")):
+        if _path not in sys.path:
+            sys.path.insert(0, _path)
+        break
 
 try:
     from app.main import app  # noqa: E402
 except Exception as exc:
     # If import fails, serve a diagnostic page with the real error
     # instead of a generic FUNCTION_INVOCATION_FAILED.
+    import traceback
+
     from fastapi import FastAPI
     from fastapi.responses import PlainTextResponse
 
@@ -0,0 +1,218 @@
+"""
+Admission control for CPU-heavy routes.
+
+Pricing and serialising a quote is pure CPU work. Done inside an
+``async def`` route, one 50,000-line quote used to hold the event loop and
+stall every other request, page loads included.
+
+``Admission`` keeps small requests (up to ``inline_limit`` lines of work)
+on the inline fast path and sends larger ones to a bounded worker pool so
+the event loop keeps serving. Each route has its own ``RouteLimiter``: at
+most ``concurrency`` large requests run at once and at most ``queue`` more
+wait. Beyond that the request is shed with ``Overloaded``, which the app
+answers with ``503`` and a ``Retry-After`` estimated from recent service
+times.
+
+The pool is threads by default, which works everywhere including
+serverless hosts. ``WD_HEAVY_EXECUTOR=process`` uses worker processes
+instead, so large quotes also stop competing with the event loop for the
+GIL; work that touches in-process state (quote sessions) always uses
+threads via ``run_threaded``.
+
+Settings: ``WD_INLINE_LINES`` (default 500), ``WD_HEAVY_EXECUTOR``
+(``thread`` or ``process``), ``WD_HEAVY_WORKERS`` (default 2),
+``WD_HEAVY_CONCURRENCY`` per route (default: workers) and
+``WD_HEAVY_QUEUE`` per route (default 8).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from app.catalogue import Catalogue, get_catalogue, set_catalogue
+from app.estimator import generate_quote_json
+from app.metrics import REGISTRY, Counter
+from app.quote_store import get_quote_store
+
+THREAD = "thread"
+PROCESS = "process"
+
+INLINE = "inline"
+EXECUTOR = "executor"
+SHED = "shed"
+
+ADMISSIONS = REGISTRY.register(Counter(
+    "wd_admission_total",
+    "Heavy-route requests by how they were admitted.",
+    ("route", "path"),
+))
+
+
+class Overloaded(Exception):
+    """Raised when a route's queue of large requests is full."""
+
+    def __init__(self, route: str, retry_after: int) -> None:
+        super().__init__(f"Too many large requests for {route}; retry later")
+        self.route = route
+        self.retry_after = retry_after
+
+
+class RouteLimiter:
+    """Concurrency cap plus bounded wait queue for one route."""
+
+    def __init__(self, route: str, concurrency: int, queue: int) -> None:
+        self.route = route
+        self.concurrency = concurrency
+        self.queue = queue
+        self.active = 0
+        self.waiting = 0
+        # Moving average of seconds per admitted request, for Retry-After.
+        self.service_time = 1.0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((self.waiting + 1) * self.service_time / self.concurrency))
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the route's slots, waiting in its queue if need be."""
+        if self.active >= self.concurrency and self.waiting >= self.queue:
+            raise Overloaded(self.route, self.retry_after())
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        # Per request: several requests hold slots at once.
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.service_time = 0.8 * self.service_time + 0.2 * elapsed
+            self.active -= 1
+            self._semaphore.release()
+
+
+def _init_worker(catalogue: Catalogue) -> None:
+    set_catalogue(catalogue)
+
+
+class Admission:
+    """Routes large requests through per-route limiters to a worker pool."""
+
+    def __init__(
+        self,
+        inline_limit: int = 500,
+        executor: str = THREAD,
+        workers: int = 2,
+        concurrency: int | None = None,
+        queue: int = 8,
+    ) -> None:
+        if executor not in (THREAD, PROCESS):
+            raise ValueError(f"Unknown executor {executor!r}; expected {THREAD!r} or {PROCESS!r}")
+        self.inline_limit = inline_limit
+        self.executor = executor
+        self.workers = workers
+        self.concurrency = concurrency or workers
+        self.queue = queue
+        self._limiters: dict[str, RouteLimiter] = {}
+        self._threads: ThreadPoolExecutor | None = None
+        self._processes: ProcessPoolExecutor | None = None
+        self._process_version: str | None = None
+
+    def limiter(self, route: str) -> RouteLimiter:
+        limiter = self._limiters.get(route)
+        if limiter is None:
+            limiter = self._limiters[route] = RouteLimiter(route, self.concurrency, self.queue)
+        return limiter
+
+    async def run(self, route: str, size: int, fn, *args, **kwargs):
+        """
+        ``fn(*args, **kwargs)``, inline if ``size`` (lines of work) is small,
+        otherwise on the worker pool under the route's limiter.
+
+        With the process executor ``fn`` and its arguments must be picklable
+        and must not depend on state in this process. Raises ``Overloaded``
+        when the route is saturated.
+        """
+        if size <= self.inline_limit:
+            ADMISSIONS.inc(1, route, INLINE)
+            return fn(*args, **kwargs)
+        return await self._admit(route, self._pool(), partial(fn, *args, **kwargs))
+
+    async def run_threaded(self, route: str, size: int, fn, *args, **kwargs):
+        """Like ``run`` but always on a thread, for work on in-process objects."""
+        if size <= self.inline_limit:
+            ADMISSIONS.inc(1, route, INLINE)
+            return fn(*args, **kwargs)
+        return await self._admit(route, self._thread_pool(), partial(fn, *args, **kwargs))
+
+    async def _admit(self, route: str, pool: Executor, call):
+        try:
+            async with self.limiter(route).slot():
+                ADMISSIONS.inc(1, route, EXECUTOR)
+                return await asyncio.get_running_loop().run_in_executor(pool, call)
+        except Overloaded:
+            ADMISSIONS.inc(1, route, SHED)
+            raise
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="heavy")
+        return self._threads
+
+    def _pool(self) -> Executor:
+        if self.executor == THREAD:
+            return self._thread_pool()
+        catalogue = get_catalogue()
+        if self._processes is None or self._process_version != catalogue.version:
+            # Workers price against the catalogue they were started with.
+            if self._processes is not None:
+                self._processes.shutdown(wait=False)
+            self._processes = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(catalogue,),
+            )
+            self._process_version = catalogue.version
+        return self._processes
+
+    def stats(self) -> dict:
+        limiters = self._limiters.values()
+        return {
+            "active": sum(limiter.active for limiter in limiters),
+            "waiting": sum(limiter.waiting for limiter in limiters),
+        }
+
+
+def quote_json(client_name: str, project_address: str, items: list[dict]) -> bytes:
+    """Price, serialise and store a quote; a picklable task for either executor."""
+    return generate_quote_json(client_name, project_address, items, store=get_quote_store())
+
+
+ADMISSION = Admission(
+    inline_limit=int(os.environ.get("WD_INLINE_LINES", "500")),
+    executor=os.environ.get("WD_HEAVY_EXECUTOR", THREAD),
+    workers=int(os.environ.get("WD_HEAVY_WORKERS", "2")),
+    concurrency=int(os.environ.get("WD_HEAVY_CONCURRENCY", "0")) or None,
+    queue=int(os.environ.get("WD_HEAVY_QUEUE", "8")),
+)
+
+
+def _collect() -> list[tuple]:
+    stats = ADMISSION.stats()
+    return [
+        ("wd_admission_active", "gauge", "Large requests running on the worker pool.", stats["active"]),
+        ("wd_admission_waiting", "gauge", "Large requests queued for a worker.", stats["waiting"]),
+    ]
+
+
+REGISTRY.add_collector(_collect)
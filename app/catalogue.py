@@ -0,0 +1,217 @@
+"""
+Compiled product catalogue for the estimating engine.
+
+The raw catalogue in ``app/products.py`` is a set of plain lists, which is
+convenient to edit but slow to search. ``Catalogue`` indexes those lists by
+id once, so every lookup the estimator makes is a single dict access no
+matter how many products, glass types, finishes or add-ons exist.
+
+Compilation happens on the first ``get_catalogue()`` call rather than at
+import. If ``app/catalogue_snapshot.json`` was written from the current
+``app/products.py`` (see ``python -m app.startup``), the catalogue is
+loaded from it without importing or re-hashing the product lists. With
+``WD_PRICE_LIST`` set, the catalogue comes from that price-list file and is
+hot-reloaded when it changes (see ``app.price_lists``).
+
+A ``Catalogue`` is never modified once built. Changing prices means
+building a new one and swapping it in with ``set_catalogue``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+_APP_DIR = Path(__file__).resolve().parent
+PRODUCTS_SOURCE = _APP_DIR / "products.py"
+SNAPSHOT_PATH = _APP_DIR / "catalogue_snapshot.json"
+
+
+class Catalogue:
+    """Id-keyed, read-only view over the product catalogue."""
+
+    __slots__ = (
+        "products",
+        "glass_options",
+        "finish_options",
+        "addon_options",
+        "product_index",
+        "glass_index",
+        "finish_index",
+        "addon_index",
+        "applicable_addons",
+        "base_prices",
+        "version",
+        "_products",
+        "_glass",
+        "_finishes",
+        "_addons",
+    )
+
+    def __init__(
+        self,
+        products: list[dict],
+        glass_options: list[dict],
+        finish_options: list[dict],
+        addon_options: list[dict],
+        version: str | None = None,
+    ) -> None:
+        self.products = tuple(products)
+        self.glass_options = tuple(glass_options)
+        self.finish_options = tuple(finish_options)
+        self.addon_options = tuple(addon_options)
+
+        # Position of each id in its list (first occurrence wins, matching
+        # the linear scans this replaces).
+        self.product_index = _index_by_id(self.products)
+        self.glass_index = _index_by_id(self.glass_options)
+        self.finish_index = _index_by_id(self.finish_options)
+        self.addon_index = _index_by_id(self.addon_options)
+
+        self._products = {pid: self.products[i] for pid, i in self.product_index.items()}
+        self._glass = {gid: self.glass_options[i] for gid, i in self.glass_index.items()}
+        self._finishes = {fid: self.finish_options[i] for fid, i in self.finish_index.items()}
+        self._addons = {aid: self.addon_options[i] for aid, i in self.addon_index.items()}
+
+        # Add-on ids that may be priced against each product.
+        self.applicable_addons = {
+            product["id"]: frozenset(
+                addon["id"]
+                for addon in self.addon_options
+                if product["category"] in addon["applies_to"]
+            )
+            for product in self.products
+        }
+
+        # Base price of every size, addressed by [product position][size index].
+        self.base_prices = tuple(
+            tuple(size["base_price"] for size in product["sizes"])
+            for product in self.products
+        )
+
+        self.version = version or catalogue_version(
+            self.products, self.glass_options, self.finish_options, self.addon_options
+        )
+
+    @property
+    def default_glass(self) -> dict:
+        return self.glass_options[0]
+
+    @property
+    def default_finish(self) -> dict:
+        return self.finish_options[0]
+
+    def get_product(self, product_id: str) -> dict | None:
+        return self._products.get(product_id)
+
+    def get_glass(self, glass_id: str) -> dict | None:
+        return self._glass.get(glass_id)
+
+    def get_finish(self, finish_id: str) -> dict | None:
+        return self._finishes.get(finish_id)
+
+    def get_addon(self, addon_id: str) -> dict | None:
+        return self._addons.get(addon_id)
+
+    def addon_applies(self, product_id: str, addon_id: str) -> bool:
+        """True if the add-on can be priced against the product."""
+        applicable = self.applicable_addons.get(product_id)
+        return applicable is not None and addon_id in applicable
+
+
+def catalogue_version(*sections) -> str:
+    """Short content hash of the catalogue data; changes with any edit."""
+    payload = json.dumps(sections, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def _index_by_id(entries: tuple[dict, ...]) -> dict[str, int]:
+    index: dict[str, int] = {}
+    for position, entry in enumerate(entries):
+        index.setdefault(entry["id"], position)
+    return index
+
+
+def compile_catalogue() -> Catalogue:
+    """Build a ``Catalogue`` from the lists in ``app/products.py``."""
+    from app.products import (
+        ADDON_OPTIONS,
+        DOOR_TYPES,
+        FINISH_OPTIONS,
+        GLASS_OPTIONS,
+        WINDOW_TYPES,
+    )
+
+    return Catalogue(
+        products=WINDOW_TYPES + DOOR_TYPES,
+        glass_options=GLASS_OPTIONS,
+        finish_options=FINISH_OPTIONS,
+        addon_options=ADDON_OPTIONS,
+    )
+
+
+def source_digest() -> str:
+    """SHA-256 of ``app/products.py``, used to detect a stale snapshot."""
+    return hashlib.sha256(PRODUCTS_SOURCE.read_bytes()).hexdigest()
+
+
+def write_snapshot(catalogue: Catalogue, path: str | Path = SNAPSHOT_PATH) -> None:
+    """Save ``catalogue`` as a JSON snapshot tied to the current product source."""
+    snapshot = {
+        "source_sha256": source_digest(),
+        "version": catalogue.version,
+        "products": list(catalogue.products),
+        "glass_options": list(catalogue.glass_options),
+        "finish_options": list(catalogue.finish_options),
+        "addon_options": list(catalogue.addon_options),
+    }
+    Path(path).write_text(json.dumps(snapshot, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+
+
+def load_snapshot(path: str | Path = SNAPSHOT_PATH) -> Catalogue | None:
+    """
+    The catalogue stored in a snapshot, or ``None`` if there is no snapshot
+    or it was taken from a different ``app/products.py``.
+    """
+    try:
+        snapshot = json.loads(Path(path).read_bytes())
+        if snapshot["source_sha256"] != source_digest():
+            return None
+        return Catalogue(
+            products=snapshot["products"],
+            glass_options=snapshot["glass_options"],
+            finish_options=snapshot["finish_options"],
+            addon_options=snapshot["addon_options"],
+            version=snapshot["version"],
+        )
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+_CATALOGUE: Catalogue | None = None
+
+
+def get_catalogue() -> Catalogue:
+    """Return the compiled catalogue the estimator prices against."""
+    global _CATALOGUE
+    if _CATALOGUE is None:
+        # A concurrent first call may compile twice; both results are equal.
+        catalogue = load_snapshot() or compile_catalogue()
+        price_list = os.environ.get("WD_PRICE_LIST")
+        if price_list:
+            from app.price_lists import watch_price_list
+
+            catalogue = watch_price_list(price_list, catalogue)
+        _CATALOGUE = catalogue
+    return _CATALOGUE
+
+
+def set_catalogue(catalogue: Catalogue) -> None:
+    """
+    Make ``catalogue`` the one the estimator prices against. Quotes already
+    running keep the catalogue they started with.
+    """
+    global _CATALOGUE
+    _CATALOGUE = catalogue
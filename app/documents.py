@@ -0,0 +1,315 @@
+"""
+Server-side quote documents: print-ready HTML and PDF.
+
+``result.html`` lays a quote out in the browser, which is slow for big
+quotes and leaves nothing to email or archive. Here a stored quote is
+rendered on the server instead:
+
+- ``html``: a self-contained page (inline CSS, no scripts) that prints on A4;
+- ``pdf``: laid out with the pure-Python writer in ``app.pdf``.
+
+Both are generated as a stream of chunks, page by page for the PDF, so the
+first bytes go out while the rest of a large quote is still being laid
+out. A fully rendered document is kept in ``DocumentCache`` under its quote
+number, catalogue version and format, so downloading it again skips
+rendering entirely. Entries remember a checksum of the stored quote, so a
+session that re-saves its quote under the same number is rendered afresh.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from collections.abc import Iterator
+from datetime import datetime
+
+from app.metrics import REGISTRY
+from app.pdf import A4, BOLD, Canvas, PdfWriter, fit_text
+from app.startup import get_templates
+
+HTML = "html"
+PDF = "pdf"
+MEDIA_TYPES = {HTML: "text/html; charset=utf-8", PDF: "application/pdf"}
+
+# Bumped whenever the layout changes, so clients drop cached copies.
+LAYOUT_VERSION = "1"
+
+# HTML is flushed to the client in chunks of about this size.
+CHUNK_BYTES = 64 * 1024
+
+COMPANY = (
+    "Blackline Steel Frame & Truss Pty Ltd",
+    "30 Access Avenue, Yatala QLD 4207",
+    "0421 502 800",
+)
+
+TERMS = (
+    "Quote valid for 30 days from date of issue.",
+    "25% deposit required upon acceptance. 50% due upon approval of shop drawings, prior to manufacture.",
+    "Balance due on delivery. Lead time 4-6 weeks from deposit and approved shop drawings.",
+    "Prices are supply only, ex-works Yatala QLD. Delivery and installation not included unless quoted separately.",
+    "All steel frames powder-coated to Australian Standards. 10-year structural warranty on steel frames.",
+    "Glass specifications subject to compliance with NCC/BCA requirements for the specific installation location.",
+)
+
+_VERSION_FIELD = re.compile(rb'"catalogue_version":\s*"([^"\\]*)"\s*}\s*$')
+
+
+def money(value: float) -> str:
+    return f"${value:,.2f}"
+
+
+def issued_date(timestamp: float) -> str:
+    issued = datetime.fromtimestamp(timestamp)
+    return f"{issued.day} {issued:%B %Y}"
+
+
+def catalogue_version_of(document: bytes) -> str:
+    """
+    The ``catalogue_version`` of stored quote JSON without parsing it (it is
+    always the last field); empty for quotes stored before it was recorded.
+    """
+    found = _VERSION_FIELD.search(document[-200:])
+    return found.group(1).decode("utf-8") if found else ""
+
+
+class StoredQuote:
+    """A stored quote document plus what identifies its renderings."""
+
+    __slots__ = ("quote_number", "document", "created_at", "catalogue_version", "checksum")
+
+    def __init__(self, quote_number: str, document: bytes, created_at: float) -> None:
+        self.quote_number = quote_number
+        self.document = document
+        self.created_at = created_at
+        self.catalogue_version = catalogue_version_of(document)
+        self.checksum = zlib.crc32(document)
+
+    def etag(self, kind: str) -> str:
+        return f'"{self.quote_number}.{self.catalogue_version or "0"}.{self.checksum:08x}.{kind}{LAYOUT_VERSION}"'
+
+    def filename(self, kind: str) -> str:
+        return f"{self.quote_number}.{kind}"
+
+
+class DocumentCache:
+    """LRU of rendered documents, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # (quote_number, catalogue_version, kind) -> (checksum, body)
+        self._entries: OrderedDict[tuple[str, str, str], tuple[int, bytes]] = OrderedDict()
+
+    def get(self, quote: StoredQuote, kind: str) -> bytes | None:
+        key = (quote.quote_number, quote.catalogue_version, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != quote.checksum:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, quote: StoredQuote, kind: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        key = (quote.quote_number, quote.catalogue_version, kind)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            self._entries[key] = (quote.checksum, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
+
+
+def render_html(quote: dict, issued: str) -> Iterator[bytes]:
+    """The quote as a print-ready HTML page, in chunks."""
+    template = get_templates().env.get_template("quote_document.html")
+    pending: list[str] = []
+    size = 0
+    for text in template.generate(quote=quote, issued=issued, company=COMPANY, terms=TERMS, money=money):
+        pending.append(text)
+        size += len(text)
+        if size >= CHUNK_BYTES:
+            yield "".join(pending).encode("utf-8")
+            pending.clear()
+            size = 0
+    if pending:
+        yield "".join(pending).encode("utf-8")
+
+
+# PDF layout, in points on A4.
+_MARGIN = 40
+_RIGHT = A4[0] - _MARGIN
+_ROW = 13
+_FONT = 7.5
+_GREY = (0.42, 0.42, 0.42)
+_ACCENT = (0.77, 0.65, 0.45)
+# (heading, x, width, align)
+_COLUMNS = (
+    ("#", _MARGIN, 22, "left"),
+    ("Product", 62, 110, "left"),
+    ("Size", 176, 70, "left"),
+    ("Glass", 250, 88, "left"),
+    ("Finish", 342, 58, "left"),
+    ("Add-Ons", 404, 70, "left"),
+    ("Qty", 492, 16, "right"),
+    ("Line Total", _RIGHT, 60, "right"),
+)
+
+
+def _table_header(canvas: Canvas, y: float) -> float:
+    canvas.rect(_MARGIN, y - 4, _RIGHT - _MARGIN, _ROW + 2)
+    for heading, x, _, align in _COLUMNS:
+        canvas.text(x, y, heading, _FONT, BOLD, align=align)
+    return y - _ROW - 2
+
+
+def _first_page_header(canvas: Canvas, quote: dict, issued: str) -> float:
+    top = A4[1] - _MARGIN
+    canvas.text(_MARGIN, top - 14, "BLACKLINE", 16, BOLD)
+    canvas.text(_MARGIN, top - 24, "S T R U C T U R E S", 6, colour=_GREY)
+    for i, line in enumerate(COMPANY):
+        canvas.text(_MARGIN, top - 40 - i * 10, line, 8, colour=_GREY)
+    canvas.text(_RIGHT, top - 6, "Quote Reference", 8, colour=_GREY, align="right")
+    canvas.text(_RIGHT, top - 22, quote["quote_number"], 14, BOLD, _ACCENT, align="right")
+    canvas.text(_RIGHT, top - 34, issued, 8, colour=_GREY, align="right")
+
+    y = top - 92
+    canvas.rect(_MARGIN, y - 8, _RIGHT - _MARGIN, 36)
+    half = (_RIGHT - _MARGIN) / 2
+    for x, label, value in (
+        (_MARGIN + 8, "PREPARED FOR", quote["client_name"]),
+        (_MARGIN + half, "PROJECT ADDRESS", quote["project_address"]),
+    ):
+        canvas.text(x, y + 16, label, 6.5, colour=_GREY)
+        canvas.text(x, y + 2, fit_text(value, half - 16, 10, BOLD), 10, BOLD)
+    return _table_header(canvas, y - 30)
+
+
+def _footer(canvas: Canvas, quote: dict, page: int) -> None:
+    note = quote["quote_number"]
+    if quote.get("catalogue_version"):
+        note += f"  ·  price list {quote['catalogue_version']}"
+    canvas.text(_MARGIN, _MARGIN - 16, note, 7, colour=_GREY)
+    canvas.text(_RIGHT, _MARGIN - 16, f"Page {page}", 7, colour=_GREY, align="right")
+
+
+def render_pdf(quote: dict, issued: str) -> Iterator[bytes]:
+    """The quote as a PDF, yielded a page at a time."""
+    writer = PdfWriter(A4)
+    yield writer.begin()
+    page = 1
+    canvas = Canvas()
+    y = _first_page_header(canvas, quote, issued)
+    for number, item in enumerate(quote["line_items"], 1):
+        if y < _MARGIN + _ROW:
+            _footer(canvas, quote, page)
+            yield writer.page(canvas)
+            page += 1
+            canvas = Canvas()
+            y = _table_header(canvas, A4[1] - _MARGIN - 10)
+        cells = (
+            str(number),
+            item["product_name"],
+            item["size_label"],
+            item["glass_option"],
+            item["finish_option"],
+            ", ".join(item["addons"]) or "-",
+            str(item["quantity"]),
+            money(item["line_total"]),
+        )
+        canvas.row(y, [
+            (x, fit_text(text, width, _FONT), align)
+            for text, (_, x, width, align) in zip(cells, _COLUMNS)
+        ], _FONT)
+        canvas.line(_MARGIN, y - 4, _RIGHT, y - 4)
+        y -= _ROW
+
+    # Totals and terms stay together, on a new page if need be.
+    needed = 60 + 14 + 11 * len(TERMS)
+    if y - needed < _MARGIN:
+        _footer(canvas, quote, page)
+        yield writer.page(canvas)
+        page += 1
+        canvas = Canvas()
+        y = A4[1] - _MARGIN - 10
+    y -= 10
+    left = _RIGHT - 190
+    for label, value, size in (
+        ("Subtotal (ex GST)", quote["subtotal"], 9),
+        ("GST (10%)", quote["gst"], 9),
+    ):
+        canvas.text(left, y, label, size, colour=_GREY)
+        canvas.text(_RIGHT, y, money(value), size, BOLD, align="right")
+        y -= 14
+    canvas.line(left, y + 8, _RIGHT, y + 8, colour=(0.6, 0.6, 0.6))
+    y -= 6
+    canvas.text(left, y, "Total (inc GST)", 11, BOLD)
+    canvas.text(_RIGHT, y, money(quote["total"]), 12, BOLD, _ACCENT, align="right")
+    y -= 30
+    canvas.text(_MARGIN, y, "Terms & Conditions", 8, BOLD)
+    for term in TERMS:
+        y -= 11
+        canvas.text(_MARGIN + 6, y, "- " + term, 6.5, colour=_GREY)
+    _footer(canvas, quote, page)
+    yield writer.page(canvas)
+    yield writer.finish(title=f"Quote {quote['quote_number']}")
+
+
+_RENDERERS = {HTML: render_html, PDF: render_pdf}
+
+
+def render_document(stored: StoredQuote, kind: str, cache: DocumentCache | None = None) -> Iterator[bytes]:
+    """
+    Render ``stored`` as ``kind`` in chunks; once every chunk has been
+    produced the whole document is added to ``cache``.
+    """
+    quote = json.loads(stored.document)
+    chunks = []
+    for chunk in _RENDERERS[kind](quote, issued_date(stored.created_at)):
+        chunks.append(chunk)
+        yield chunk
+    if cache is not None:
+        cache.put(stored, kind, b"".join(chunks))
+
+
+_cache: DocumentCache | None = None
+
+
+def get_document_cache() -> DocumentCache:
+    """The process-wide render cache (``WD_DOCUMENT_CACHE_BYTES``, default 64 MB)."""
+    global _cache
+    if _cache is None:
+        _cache = DocumentCache(int(os.environ.get("WD_DOCUMENT_CACHE_BYTES", 64 * 1024 * 1024)))
+    return _cache
+
+
+def _collect() -> list[tuple]:
+    if _cache is None:
+        return []
+    stats = _cache.stats()
+    return [
+        ("wd_document_cache_hits_total", "counter", "Quote documents served from the render cache.", stats["hits"]),
+        ("wd_document_cache_misses_total", "counter", "Quote documents that had to be rendered.", stats["misses"]),
+        ("wd_document_cache_bytes", "gauge", "Bytes of rendered documents held.", stats["bytes"]),
+    ]
+
+
+REGISTRY.add_collector(_collect)
@@ -11,59 +11,120 @@ Calculates pricing for window and door configurations based on:
 
 from __future__ import annotations
 
-import random
-import string
-from datetime import datetime
+import re
+import threading
+from collections import OrderedDict
 
+from app.batch import price_schedule, write_quote_json
+from app.catalogue import Catalogue, get_catalogue
+from app.metrics import REGISTRY, timed
 from app.models import QuoteLineItem, QuoteResult
-from app.products import (
-    ADDON_OPTIONS,
-    FINISH_OPTIONS,
-    GLASS_OPTIONS,
-    get_product_by_id,
-)
+from app.quote_numbers import next_quote_number
+from app.quote_store import DuplicateQuoteNumber
+from app.size_matching import NEXT_LARGER, match_sizes
 
-GST_RATE = 0.10  # 10% Australian GST
+
+# Fresh quote numbers tried before giving up on storing a quote.
+_SAVE_ATTEMPTS = 3
 
 
 def _generate_quote_number() -> str:
-    """Generate a quote reference like BLS-WD-250226-A3X."""
-    date_part = datetime.now().strftime("%y%m%d")
-    random_part = "".join(random.choices(string.ascii_uppercase + string.digits, k=3))
-    return f"BLS-WD-{date_part}-{random_part}"
+    """Generate a unique quote reference like BLS-WD-250226-K7Q2M9XB00A."""
+    with timed("quote_number"):
+        return next_quote_number()
 
 
-def _find_glass(glass_id: str) -> dict | None:
-    for g in GLASS_OPTIONS:
-        if g["id"] == glass_id:
-            return g
-    return None
+class PricingCache:
+    """
+    Bounded LRU of resolved line configurations.
 
+    Keys are ``(product_id, size_index, glass_id, finish_id, sorted addon_ids)``;
+    values hold the unit price and every resolved name, so a hit only has
+    to apply the quantity. Entries are stored under the catalogue version
+    they were priced from, so a line priced on the old catalogue during a
+    reload is never served to callers on the new one. The first lookup on a
+    new version drops the older entries. Safe to share between threads.
 
-def _find_finish(finish_id: str) -> dict | None:
-    for f in FINISH_OPTIONS:
-        if f["id"] == finish_id:
-            return f
-    return None
+    This backs the per-line ``calculate_line_item``. Quotes are priced by
+    ``app.batch``, which resolves each distinct configuration once per
+    schedule instead.
+    """
 
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self.version: str | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()
 
-def _find_addon(addon_id: str) -> dict | None:
-    for a in ADDON_OPTIONS:
-        if a["id"] == addon_id:
-            return a
-    return None
+    def __len__(self) -> int:
+        return len(self._entries)
 
+    def get(self, key: tuple, version: str) -> tuple | None:
+        with self._lock:
+            if version != self.version:
+                stale = [k for k in self._entries if k[0] != version]
+                if stale:
+                    self.invalidations += 1
+                for k in stale:
+                    del self._entries[k]
+                self.version = version
+            entry = self._entries.get((version, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end((version, key))
+            return entry
 
-def calculate_line_item(
+    def put(self, key: tuple, version: str, entry: tuple) -> None:
+        """Store ``entry`` as priced from catalogue ``version``."""
+        with self._lock:
+            self._entries[version, key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "catalogue_version": self.version,
+            }
+
+
+PRICING_CACHE = PricingCache()
+
+REGISTRY.add_collector(lambda: [
+    ("wd_pricing_cache_hits_total", "counter", "Line pricing cache hits.", PRICING_CACHE.hits),
+    ("wd_pricing_cache_misses_total", "counter", "Line pricing cache misses.", PRICING_CACHE.misses),
+    ("wd_pricing_cache_evictions_total", "counter", "Line pricing cache evictions.", PRICING_CACHE.evictions),
+    ("wd_pricing_cache_entries", "gauge", "Resolved configurations held in the cache.", len(PRICING_CACHE)),
+])
+
+
+def _resolve_line(
+    catalogue: Catalogue,
     product_id: str,
     size_index: int,
-    quantity: int,
-    glass_id: str = "laminated-6.38mm",
-    finish_id: str = "black",
-    addon_ids: list[str] | None = None,
-) -> QuoteLineItem:
-    """Calculate a single line item price."""
-    product = get_product_by_id(product_id)
+    glass_id: str,
+    finish_id: str,
+    addon_key: tuple[str, ...],
+) -> tuple:
+    """Resolve one configuration to its unit price and display names."""
+    product = catalogue.get_product(product_id)
     if not product:
         raise ValueError(f"Unknown product: {product_id}")
 
@@ -73,35 +134,85 @@ def calculate_line_item(
     size = product["sizes"][size_index]
     base_price = size["base_price"]
 
-    glass = _find_glass(glass_id) or GLASS_OPTIONS[0]
-    finish = _find_finish(finish_id) or FINISH_OPTIONS[0]
+    glass = catalogue.get_glass(glass_id) or catalogue.default_glass
+    finish = catalogue.get_finish(finish_id) or catalogue.default_finish
 
-    addon_ids = addon_ids or []
     addon_total = 0.0
-    valid_addons = []
-    for aid in addon_ids:
-        addon = _find_addon(aid)
-        if addon and product["category"] in addon["applies_to"]:
+    addon_names = {}
+    for aid in addon_key:
+        if catalogue.addon_applies(product_id, aid):
+            addon = catalogue.get_addon(aid)
             addon_total += addon["price"]
-            valid_addons.append(addon["name"])
+            addon_names[aid] = addon["name"]
 
     unit_price = (base_price * glass["multiplier"]) + finish["surcharge"] + addon_total
+
+    return (
+        product["name"],
+        size["label"],
+        float(base_price),
+        glass["name"],
+        float(glass["multiplier"]),
+        finish["name"],
+        float(finish["surcharge"]),
+        addon_names,
+        addon_total,
+        unit_price,
+    )
+
+
+def calculate_line_item(
+    product_id: str,
+    size_index: int,
+    quantity: int,
+    glass_id: str = "laminated-6.38mm",
+    finish_id: str = "black",
+    addon_ids: list[str] | None = None,
+) -> QuoteLineItem:
+    """Calculate a single line item price."""
+    catalogue = get_catalogue()
+    addon_ids = addon_ids or []
+    key = (product_id, size_index, glass_id, finish_id, tuple(sorted(addon_ids)))
+
+    entry = PRICING_CACHE.get(key, catalogue.version)
+    if entry is None:
+        entry = _resolve_line(catalogue, *key)
+        PRICING_CACHE.put(key, catalogue.version, entry)
+
+    (
+        product_name,
+        size_label,
+        base_price,
+        glass_name,
+        glass_multiplier,
+        finish_name,
+        finish_surcharge,
+        addon_names,
+        addon_total,
+        unit_price,
+    ) = entry
+    # Names are reported in request order, duplicates included.
+    valid_addons = [addon_names[aid] for aid in addon_ids if aid in addon_names]
     line_total = unit_price * quantity
 
-    return QuoteLineItem(
+    fields = dict(
         product_id=product_id,
-        product_name=product["name"],
-        size_label=size["label"],
+        product_name=product_name,
+        size_label=size_label,
         quantity=quantity,
         base_unit_price=base_price,
-        glass_option=glass["name"],
-        glass_multiplier=glass["multiplier"],
-        finish_option=finish["name"],
-        finish_surcharge=finish["surcharge"],
+        glass_option=glass_name,
+        glass_multiplier=glass_multiplier,
+        finish_option=finish_name,
+        finish_surcharge=finish_surcharge,
         addons=valid_addons,
         addon_total=addon_total,
         line_total=round(line_total, 2),
     )
+    if type(quantity) is int:
+        # Everything else came out of the catalogue already typed.
+        return QuoteLineItem.model_construct(**fields)
+    return QuoteLineItem(**fields)
 
 
 def generate_quote(
@@ -114,32 +225,59 @@ def generate_quote(
 
     Each item dict should contain:
         product_id, size_index, quantity, glass_id, finish_id, addon_ids
+
+    Pricing runs through the columnar batch engine in ``app/batch.py``.
     """
-    line_items = []
-    for item in items:
-        li = calculate_line_item(
-            product_id=item["product_id"],
-            size_index=item.get("size_index", 0),
-            quantity=item.get("quantity", 1),
-            glass_id=item.get("glass_id", "laminated-6.38mm"),
-            finish_id=item.get("finish_id", "matt-black"),
-            addon_ids=item.get("addon_ids", []),
+    batch = price_schedule(items)
+    quote_number = _generate_quote_number()
+    with timed("model"):
+        return batch.to_quote_result(
+            quote_number=quote_number,
+            client_name=client_name,
+            project_address=project_address,
         )
-        line_items.append(li)
-
-    subtotal = round(sum(li.line_total for li in line_items), 2)
-    gst = round(subtotal * GST_RATE, 2)
-    total = round(subtotal + gst, 2)
-
-    return QuoteResult(
-        quote_number=_generate_quote_number(),
-        client_name=client_name,
-        project_address=project_address,
-        line_items=line_items,
-        subtotal=subtotal,
-        gst=gst,
-        total=total,
-    )
+
+
+def generate_quote_json(
+    client_name: str,
+    project_address: str,
+    items: list[dict],
+    store=None,
+) -> bytes:
+    """
+    Like ``generate_quote`` but returns the ``QuoteResult`` as JSON bytes.
+
+    If a ``QuoteStore`` is given the quote is also saved to it, under a fresh
+    quote number if the first one turns out to be taken.
+    """
+    batch = price_schedule(items)
+    for attempt in range(_SAVE_ATTEMPTS):
+        quote_number = _generate_quote_number()
+        with timed("serialise"):
+            body = write_quote_json(
+                batch,
+                quote_number=quote_number,
+                client_name=client_name,
+                project_address=project_address,
+            )
+        if store is None:
+            return body
+        try:
+            with timed("store"):
+                store.save(
+                    quote_number,
+                    client_name,
+                    project_address,
+                    subtotal=batch.subtotal,
+                    gst=batch.gst,
+                    total=batch.total,
+                    line_count=len(batch),
+                    document=body,
+                )
+            return body
+        except DuplicateQuoteNumber:
+            if attempt == _SAVE_ATTEMPTS - 1:
+                raise
 
 
 # --- Simulated AI Takeoff ---
@@ -211,19 +349,47 @@ SAMPLE_TAKEOFF_RESULTS = [
 ]
 
 
-def simulate_ai_takeoff(filename: str) -> dict:
+_PDF_PAGE = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+
+
+def count_pages(document) -> int:
+    """Pages in a PDF (1 for images), scanned in place from any bytes-like view."""
+    if bytes(document[:5]) != b"%PDF-":
+        return 1
+    return sum(1 for _ in _PDF_PAGE.finditer(document)) or 1
+
+
+def _match_sizes(items: list[dict]) -> list[dict]:
+    """Set each item's ``size_index`` from the dimensions in its schedule note."""
+    matches = match_sizes(
+        [{"product_id": item["product_id"], "size": item["extracted_note"]} for item in items],
+        mode=NEXT_LARGER,
+    )
+    return [
+        dict(item, size_index=match["size_index"]) if "size_index" in match else item
+        for item, match in zip(items, matches)
+    ]
+
+
+def simulate_ai_takeoff(filename: str, document=None) -> dict:
     """
     Simulate AI extraction from an uploaded window/door schedule.
     Returns extracted line items as if an AI parsed the construction document.
+
+    ``document`` is an optional read-only view of the uploaded file (see
+    ``app.uploads``); when given, its size and page count are reported.
     """
-    return {
+    result = {
         "filename": filename,
         "status": "extracted",
         "confidence": 0.94,
-        "extracted_items": SAMPLE_TAKEOFF_RESULTS,
+        "extracted_items": _match_sizes(SAMPLE_TAKEOFF_RESULTS),
         "summary": {
             "total_windows": 13,
             "total_doors": 3,
             "unique_types": 7,
         },
     }
+    if document is not None:
+        result["document"] = {"bytes": len(document), "pages": count_pages(document)}
+    return result
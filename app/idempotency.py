@@ -0,0 +1,177 @@
+"""
+Request coalescing and idempotent replays.
+
+Double-clicks and client retries used to price the same schedule again and
+mint a fresh quote number each time. ``Coalescer`` sits in front of a
+route's computation:
+
+- identical payloads that arrive while one is being computed wait for that
+  computation and get its result (*coalesced*);
+- a retry carrying the same ``Idempotency-Key`` header gets the original
+  response for ``key_ttl`` seconds (*replayed*); reusing a key with a
+  different payload is rejected;
+- without a key, an identical payload is still replayed within a short
+  ``dedup_window``, which catches double-submits.
+
+Payloads are identified by a SHA-256 of their canonical JSON (sorted keys,
+no whitespace), or of the raw request body when that is passed instead.
+The routes pass the raw body: retries and double-submits resend the same
+bytes, and hashing them is far cheaper than re-encoding a large schedule.
+Bodies that differ only in key order or whitespace are therefore treated
+as different requests. Every outcome is counted in
+``wd_request_dedup_total{route, outcome}``; ``coalesced`` plus ``replayed``
+is the number of computations saved.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from app.metrics import REGISTRY, Counter
+
+COMPUTED = "computed"
+COALESCED = "coalesced"
+REPLAYED = "replayed"
+
+DEDUP_OUTCOMES = REGISTRY.register(Counter(
+    "wd_request_dedup_total",
+    "Requests by whether they were computed or shared an earlier result.",
+    ("route", "outcome"),
+))
+
+
+class IdempotencyConflict(Exception):
+    """An ``Idempotency-Key`` was reused with a different payload."""
+
+
+def fingerprint(payload) -> str:
+    """SHA-256 of raw body bytes, or of the payload's canonical JSON."""
+    if isinstance(payload, (bytes, bytearray)):
+        return hashlib.sha256(payload).hexdigest()
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Coalescer:
+    """In-flight coalescing plus a short-lived response cache for one route."""
+
+    def __init__(
+        self,
+        route: str,
+        key_ttl: float = 600.0,
+        dedup_window: float = 10.0,
+        max_entries: int = 1024,
+    ) -> None:
+        self.route = route
+        self.key_ttl = key_ttl
+        self.dedup_window = dedup_window
+        self.max_entries = max_entries
+        self._inflight: dict[str, asyncio.Future] = {}
+        # Idempotency cache key -> (payload fingerprint, future) while its request runs.
+        self._inflight_keys: dict[str, tuple[str, asyncio.Future]] = {}
+        # cache key -> (expires_at, payload fingerprint, result)
+        self._done: OrderedDict[str, tuple[float, str, object]] = OrderedDict()
+
+    async def run(self, payload, compute, idempotency_key: str | None = None) -> tuple[object, str]:
+        """
+        Result of ``await compute()`` for ``payload``, shared where possible.
+
+        Returns ``(result, outcome)`` with outcome ``computed``, ``coalesced``
+        or ``replayed``. Failures are passed to every waiter, never cached.
+        """
+        digest = fingerprint(payload)
+        if idempotency_key:
+            cache_key, ttl = "key:" + idempotency_key, self.key_ttl
+        else:
+            cache_key, ttl = "payload:" + digest, self.dedup_window
+
+        entry = self._done.get(cache_key)
+        if entry is not None:
+            expires_at, stored_digest, result = entry
+            if expires_at > time.monotonic():
+                if stored_digest != digest:
+                    raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+                return result, self._count(REPLAYED)
+            del self._done[cache_key]
+
+        shared = self._done.get("payload:" + digest) if idempotency_key else None
+        if shared is not None and shared[0] > time.monotonic():
+            self._remember(cache_key, digest, shared[2], ttl)
+            return shared[2], self._count(REPLAYED)
+
+        if idempotency_key:
+            keyed = self._inflight_keys.get(cache_key)
+            if keyed is not None:
+                if keyed[0] != digest:
+                    raise IdempotencyConflict("Idempotency-Key is already in use by a different request")
+                result = await asyncio.shield(keyed[1])
+                self._remember(cache_key, digest, result, ttl)
+                return result, self._count(COALESCED)
+
+        pending = self._inflight.get(digest)
+        if pending is not None:
+            if not idempotency_key:
+                return await asyncio.shield(pending), self._count(COALESCED)
+            entry = self._inflight_keys[cache_key] = (digest, pending)
+            try:
+                result = await asyncio.shield(pending)
+            finally:
+                self._forget_key(cache_key, entry)
+            self._remember(cache_key, digest, result, ttl)
+            return result, self._count(COALESCED)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        if idempotency_key:
+            entry = self._inflight_keys[cache_key] = (digest, future)
+        try:
+            result = await compute()
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark it retrieved so a failure with no waiters isn't logged twice.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[digest]
+            if idempotency_key:
+                self._forget_key(cache_key, entry)
+        future.set_result(result)
+        self._remember(cache_key, digest, result, ttl)
+        if idempotency_key:
+            # Keyless retries of the same payload also replay within the window.
+            self._remember("payload:" + digest, digest, result, self.dedup_window)
+        return result, self._count(COMPUTED)
+
+    def _remember(self, cache_key: str, digest: str, result, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._done[cache_key] = (time.monotonic() + ttl, digest, result)
+        self._done.move_to_end(cache_key)
+        while len(self._done) > self.max_entries:
+            self._done.popitem(last=False)
+
+    def _forget_key(self, cache_key: str, entry: tuple[str, asyncio.Future]) -> None:
+        if self._inflight_keys.get(cache_key) is entry:
+            del self._inflight_keys[cache_key]
+
+    def _count(self, outcome: str) -> str:
+        DEDUP_OUTCOMES.inc(1, self.route, outcome)
+        return outcome
+
+
+def coalescer_from_env(route: str) -> Coalescer:
+    """A ``Coalescer`` using ``WD_IDEMPOTENCY_TTL`` and ``WD_DEDUP_WINDOW`` (seconds)."""
+    return Coalescer(
+        route,
+        key_ttl=float(os.environ.get("WD_IDEMPOTENCY_TTL", "600")),
+        dedup_window=float(os.environ.get("WD_DEDUP_WINDOW", "10")),
+    )
+
+
+QUOTE_REQUESTS = coalescer_from_env("/api/quote")
+TAKEOFF_REQUESTS = coalescer_from_env("/api/takeoff")
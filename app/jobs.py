@@ -0,0 +1,265 @@
+"""
+Background takeoff jobs.
+
+Submitting a takeoff returns a job id straight away; extraction and
+pricing run on a bounded worker pool. Clients poll the job for status,
+the partial takeoff result and the final quote, or subscribe to its
+server-sent events.
+
+Job state lives in a pluggable store so the app runs with no outside
+services: ``InMemoryJobStore`` by default, or ``SQLiteJobStore`` when
+``WD_JOB_STORE=sqlite:/path/to/jobs.db`` is set.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.estimator import generate_quote_json
+from app.quote_store import get_quote_store
+from app.takeoff_cache import cached_takeoff
+
+QUEUED = "queued"
+EXTRACTING = "extracting"
+PRICING = "pricing"
+DONE = "done"
+FAILED = "failed"
+
+FINISHED = (DONE, FAILED)
+
+_JSON_FIELDS = ("takeoff", "quote")
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at capacity."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Takeoff queue is full")
+        self.retry_after = retry_after
+
+
+def _new_job(filename: str, client_name: str, project_address: str) -> dict:
+    now = time.time()
+    return {
+        "job_id": uuid.uuid4().hex,
+        "status": QUEUED,
+        "progress": 0.0,
+        "filename": filename,
+        "client_name": client_name,
+        "project_address": project_address,
+        "created_at": now,
+        "updated_at": now,
+        "revision": 0,
+        "takeoff": None,
+        "quote": None,
+        "error": None,
+    }
+
+
+class InMemoryJobStore:
+    """Job store held in process memory; oldest jobs are dropped past ``max_jobs``."""
+
+    def __init__(self, max_jobs: int = 1000) -> None:
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, job: dict) -> None:
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            updated = dict(job, **fields)
+            updated["updated_at"] = time.time()
+            updated["revision"] = job["revision"] + 1
+            self._jobs[job_id] = updated
+
+    def get(self, job_id: str) -> dict | None:
+        return self._jobs.get(job_id)
+
+
+class SQLiteJobStore:
+    """Job store backed by an embedded SQLite database."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS takeoff_jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL,
+                filename TEXT NOT NULL,
+                client_name TEXT NOT NULL,
+                project_address TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                revision INTEGER NOT NULL,
+                takeoff TEXT,
+                quote TEXT,
+                error TEXT
+            )
+            """
+        )
+
+    def create(self, job: dict) -> None:
+        row = _to_row(job)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO takeoff_jobs ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})",
+                tuple(row.values()),
+            )
+
+    def update(self, job_id: str, **fields) -> None:
+        row = _to_row(fields)
+        row["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in row)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE takeoff_jobs SET {assignments}, revision = revision + 1 WHERE job_id = ?",
+                (*row.values(), job_id),
+            )
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM takeoff_jobs WHERE job_id = ?", (job_id,))
+            row = cursor.fetchone()
+            columns = [d[0] for d in cursor.description]
+        if row is None:
+            return None
+        job = dict(zip(columns, row))
+        for field in _JSON_FIELDS:
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+
+def _to_row(fields: dict) -> dict:
+    return {
+        key: json.dumps(value) if key in _JSON_FIELDS and value is not None else value
+        for key, value in fields.items()
+    }
+
+
+class JobQueue:
+    """
+    Bounded worker pool for takeoff jobs.
+
+    At most ``workers`` jobs run at once and at most ``max_pending`` are
+    accepted (running plus waiting); beyond that ``submit`` raises
+    ``QueueFull`` so the caller can shed load.
+    """
+
+    def __init__(self, store, workers: int = 2, max_pending: int = 32) -> None:
+        self.store = store
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="takeoff-job")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, filename: str, client_name: str = "", project_address: str = "") -> dict:
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(retry_after=5)
+        try:
+            job = _new_job(filename, client_name, project_address)
+            self.store.create(job)
+            self._pool.submit(self._run, job)
+        except BaseException:
+            # Nothing will run, so nothing else will give the slot back.
+            self._slots.release()
+            raise
+        return job
+
+    def _run(self, job: dict) -> None:
+        job_id = job["job_id"]
+        try:
+            self.store.update(job_id, status=EXTRACTING, progress=0.1)
+            takeoff = cached_takeoff(job["filename"])
+            self.store.update(job_id, status=PRICING, progress=0.6, takeoff=takeoff)
+            quote = json.loads(generate_quote_json(
+                client_name=job["client_name"],
+                project_address=job["project_address"],
+                items=takeoff["extracted_items"],
+                store=get_quote_store(),
+            ))
+            self.store.update(job_id, status=DONE, progress=1.0, quote=quote)
+        except Exception as exc:
+            self.store.update(job_id, status=FAILED, error=f"{type(exc).__name__}: {exc}")
+        finally:
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def store_from_env():
+    """Build the job store named by ``WD_JOB_STORE`` (``memory`` or ``sqlite:<path>``)."""
+    spec = os.environ.get("WD_JOB_STORE", "memory")
+    if spec.startswith("sqlite:"):
+        return SQLiteJobStore(spec.removeprefix("sqlite:"))
+    return InMemoryJobStore()
+
+
+_queue: JobQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """The process-wide job queue, created on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(
+                    store_from_env(),
+                    workers=int(os.environ.get("WD_JOB_WORKERS", "2")),
+                    max_pending=int(os.environ.get("WD_JOB_QUEUE", "32")),
+                )
+    return _queue
+
+
+async def job_events(store, job_id: str, interval: float = 0.25):
+    """Server-sent events for a job: one ``status`` event per change, until it finishes."""
+    revision = -1
+    while True:
+        job = store.get(job_id)
+        if job is None:
+            yield "event: error\ndata: {\"detail\": \"Job not found\"}\n\n"
+            return
+        if job["revision"] != revision:
+            revision = job["revision"]
+            yield f"event: status\ndata: {json.dumps(job_view(job))}\n\n"
+        if job["status"] in FINISHED:
+            return
+        await asyncio.sleep(interval)
+
+
+def job_view(job: dict) -> dict:
+    """Public representation of a job."""
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "filename": job["filename"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "takeoff": job["takeoff"],
+        "quote": job["quote"],
+        "error": job["error"],
+    }
@@ -4,26 +4,40 @@ W-D Estimating Agent — FastAPI Application
 AI-powered estimating system for Blackline Structures' steel-framed
 windows and doors. Handles product catalog display, interactive quote
 building, and simulated AI takeoff extraction.
+
+With ``WD_STARTUP=lazy`` the templates, catalogue and static files are set
+up on first use instead of at import (see ``app.startup``).
 """
 
-import json
-from pathlib import Path
-
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-
-from app.estimator import generate_quote, simulate_ai_takeoff
-from app.models import QuoteRequest, UploadTakeoffRequest
-from app.products import (
-    ADDON_OPTIONS,
-    DOOR_TYPES,
-    FINISH_OPTIONS,
-    GLASS_OPTIONS,
-    WINDOW_TYPES,
-    get_all_products,
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app import metrics
+
+from app.admission import ADMISSION, Overloaded, quote_json
+from app.catalogue import get_catalogue
+from app.idempotency import COMPUTED, QUOTE_REQUESTS, TAKEOFF_REQUESTS, IdempotencyConflict
+from app.models import (
+    QuoteRequest,
+    QuoteSessionPatch,
+    ScenarioRequest,
+    ScheduleMatchRequest,
+    SizeMatchRequest,
+    TakeoffJobRequest,
+    TakeoffQuoteRequest,
+    UploadTakeoffRequest,
 )
+from app.payloads import cached_response, get_payloads, not_modified, render_page
+from app.quote_numbers import next_quote_number
+from app.quote_store import get_quote_store
+from app.scenarios import sweep_scenarios
+from app.sessions import SESSIONS, QuoteSession
+from app.size_matching import get_size_index, match_sizes
+from app.startup import STATIC_DIR, LazyStaticFiles, get_templates, lazy_startup
+from app.streaming import ItemTooLarge, NDJSONStreamingResponse, parser_for, started, stream_quote
+from app.takeoff_cache import apply_overrides, cached_takeoff, get_takeoff_cache
+from app.text_matching import get_text_index, match_schedule
 
 app = FastAPI(
     title="W-D Estimating Agent",
@@ -31,14 +45,16 @@ app = FastAPI(
     version="0.1.0",
 )
 
-BASE_DIR = Path(__file__).resolve().parent
+if metrics.ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
 
 # Mount static files (wrapped for Vercel serverless compatibility)
-_static_dir = BASE_DIR / "static"
-if _static_dir.is_dir():
-    app.mount("/static", StaticFiles(directory=str(_static_dir)), name="static")
+if STATIC_DIR.is_dir():
+    app.mount("/static", LazyStaticFiles(STATIC_DIR), name="static")
 
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+if not lazy_startup():
+    get_templates()
+    get_payloads()
 
 
 # ──────────────────────────────────────────────
@@ -48,74 +64,428 @@ templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Landing page — product showcase."""
-    return templates.TemplateResponse("index.html", {
-        "request": request,
-        "windows": WINDOW_TYPES,
-        "doors": DOOR_TYPES,
-        "glass_options": GLASS_OPTIONS,
-        "finish_options": FINISH_OPTIONS,
-        "addon_options": ADDON_OPTIONS,
-    })
+    catalogue = get_catalogue()
+    with metrics.timed("render"):
+        return get_templates().TemplateResponse("index.html", {
+            "request": request,
+            "windows": [p for p in catalogue.products if p["category"] == "windows"],
+            "doors": [p for p in catalogue.products if p["category"] == "doors"],
+            "glass_options": catalogue.glass_options,
+            "finish_options": catalogue.finish_options,
+            "addon_options": catalogue.addon_options,
+        })
 
 
 @app.get("/quote", response_class=HTMLResponse)
 async def quote_builder(request: Request):
     """Interactive quote builder page."""
-    return templates.TemplateResponse("quote.html", {
-        "request": request,
-        "products_json": json.dumps(get_all_products()),
-        "glass_json": json.dumps(GLASS_OPTIONS),
-        "finish_json": json.dumps(FINISH_OPTIONS),
-        "addon_json": json.dumps(ADDON_OPTIONS),
-    })
+    body, etag = render_page("quote.html", lambda payloads: get_templates().get_template("quote.html").render(
+        products_json=payloads.products_json,
+        glass_json=payloads.glass_json,
+        finish_json=payloads.finish_json,
+        addon_json=payloads.addon_json,
+        matrix_json=payloads.matrix_json,
+    ))
+    return cached_response(request, body, etag, "text/html; charset=utf-8")
 
 
 @app.get("/upload", response_class=HTMLResponse)
 async def upload_page(request: Request):
     """AI takeoff upload page."""
-    return templates.TemplateResponse("upload.html", {
-        "request": request,
-        "glass_json": json.dumps(GLASS_OPTIONS),
-    })
+    body, etag = render_page("upload.html", lambda payloads: get_templates().get_template("upload.html").render(
+        glass_json=payloads.glass_json,
+    ))
+    return cached_response(request, body, etag, "text/html; charset=utf-8")
 
 
 @app.get("/result", response_class=HTMLResponse)
 async def result_page(request: Request):
     """Quote result display page."""
-    return templates.TemplateResponse("result.html", {
-        "request": request,
-    })
+    with metrics.timed("render"):
+        return get_templates().TemplateResponse("result.html", {
+            "request": request,
+        })
 
 
 # ──────────────────────────────────────────────
 # API routes
 # ──────────────────────────────────────────────
 
+@app.exception_handler(Overloaded)
+async def _shed(request: Request, exc: Overloaded):
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def _coalesced(coalescer, request: Request, compute):
+    # The body was already read for validation, so this is just a hash.
+    payload = await request.body()
+    try:
+        return await coalescer.run(payload, compute, request.headers.get("idempotency-key"))
+    except IdempotencyConflict as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+def _replay_headers(outcome: str) -> dict | None:
+    return None if outcome == COMPUTED else {"Idempotent-Replayed": "true"}
+
+
 @app.post("/api/quote")
-async def api_generate_quote(payload: QuoteRequest):
-    """Generate a priced quote from selected line items."""
-    result = generate_quote(
-        client_name=payload.client_name,
-        project_address=payload.project_address,
-        items=payload.items,
+async def api_generate_quote(payload: QuoteRequest, request: Request):
+    """
+    Generate a priced quote from selected line items.
+
+    Identical concurrent requests share one quote; retries with the same
+    ``Idempotency-Key`` header get the original quote back. Large quotes
+    are priced off the event loop and may be shed with 503 under load.
+    """
+    async def compute():
+        try:
+            return await ADMISSION.run(
+                "/api/quote",
+                len(payload.items),
+                quote_json,
+                payload.client_name,
+                payload.project_address,
+                payload.items,
+            )
+        except (KeyError, TypeError, ValueError) as exc:
+            raise HTTPException(status_code=422, detail=str(exc))
+
+    body, outcome = await _coalesced(QUOTE_REQUESTS, request, compute)
+    return Response(content=body, media_type="application/json", headers=_replay_headers(outcome))
+
+
+@app.post("/api/quote/stream")
+async def api_stream_quote(request: Request, client_name: str = "", project_address: str = ""):
+    """
+    Stream a priced quote as NDJSON while line items are still arriving.
+
+    The body is either NDJSON (one item per line) or a JSON array of items
+    (``Content-Type: application/json``). A body that is malformed from the
+    start is refused with 422, or 413 if an item is over the size cap; later
+    problems end the stream with an error record.
+    """
+    try:
+        records = await started(stream_quote(
+            request.stream(),
+            parser_for(request.headers.get("content-type")),
+            quote_number=next_quote_number(),
+            client_name=client_name,
+            project_address=project_address,
+        ))
+    except ItemTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return NDJSONStreamingResponse(records)
+
+
+@app.post("/api/quote/scenarios")
+async def api_quote_scenarios(payload: ScenarioRequest):
+    """Compare one schedule's totals across glass and finish options in one pass."""
+    try:
+        return await ADMISSION.run(
+            "/api/quote/scenarios",
+            len(payload.items),
+            sweep_scenarios,
+            payload.items,
+            payload.glass_ids,
+            payload.finish_ids,
+        )
+    except (KeyError, TypeError, ValueError) as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+@app.post("/api/quote/sessions", status_code=201)
+async def api_create_quote_session(payload: QuoteRequest):
+    """Price a quote and keep it server-side for incremental edits."""
+    try:
+        session = await ADMISSION.run_threaded(
+            "/api/quote/sessions",
+            len(payload.items),
+            QuoteSession,
+            quote_number=next_quote_number(),
+            client_name=payload.client_name,
+            project_address=payload.project_address,
+            items=payload.items,
+        )
+    except (KeyError, TypeError, ValueError) as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    SESSIONS.add(session)
+    return session.to_dict()
+
+
+@app.get("/api/quote/sessions/{session_id}")
+async def api_quote_session(session_id: str):
+    """The full current quote of a session."""
+    session = SESSIONS.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Quote session not found")
+    return session.to_dict()
+
+
+@app.patch("/api/quote/sessions/{session_id}")
+async def api_patch_quote_session(session_id: str, payload: QuoteSessionPatch):
+    """Apply add/remove/edit operations; only the touched lines are repriced."""
+    session = SESSIONS.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Quote session not found")
+    try:
+        return await ADMISSION.run_threaded("/api/quote/sessions/{session_id}", len(payload.ops), session.apply, payload.ops)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+@app.post("/api/quote/sessions/{session_id}/save")
+async def api_save_quote_session(session_id: str):
+    """Store the session's current quote so it can be reopened by quote number."""
+    session = SESSIONS.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Quote session not found")
+    return session.save(get_quote_store())
+
+
+@app.get("/api/quotes")
+async def api_search_quotes(
+    client: str | None = None,
+    address: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    min_total: float | None = None,
+    max_total: float | None = None,
+    limit: int = 50,
+    cursor: str | None = None,
+):
+    """Search stored quotes, newest first; pass ``next_cursor`` back as ``cursor`` for the next page."""
+    try:
+        return get_quote_store().search(
+            client=client,
+            address=address,
+            date_from=date_from,
+            date_to=date_to,
+            min_total=min_total,
+            max_total=max_total,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+@app.get("/api/quotes/{quote_number}")
+async def api_get_quote(quote_number: str):
+    """A stored quote, exactly as it was generated."""
+    document = get_quote_store().get_document(quote_number)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    return Response(content=document, media_type="application/json")
+
+
+async def _quote_document(request: Request, quote_number: str, kind: str, download: bool):
+    from app.documents import MEDIA_TYPES, StoredQuote, get_document_cache, render_document
+
+    record = await run_in_threadpool(get_quote_store().get_record, quote_number)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    stored = StoredQuote(quote_number, *record)
+    etag = stored.etag(kind)
+    disposition = "attachment" if download else "inline"
+    headers = {"Content-Disposition": f'{disposition}; filename="{stored.filename(kind)}"'}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    cache = get_document_cache()
+    body = cache.get(stored, kind)
+    if body is not None:
+        return cached_response(request, body, etag, MEDIA_TYPES[kind], headers)
+    return StreamingResponse(
+        render_document(stored, kind, cache),
+        media_type=MEDIA_TYPES[kind],
+        headers={"ETag": etag, "Cache-Control": "no-cache", **headers},
     )
-    return result.model_dump()
+
+
+@app.get("/api/quotes/{quote_number}/html", response_class=HTMLResponse)
+async def api_quote_html(request: Request, quote_number: str, download: bool = False):
+    """A stored quote as self-contained, print-ready HTML (streamed, then cached)."""
+    return await _quote_document(request, quote_number, "html", download)
+
+
+@app.get("/api/quotes/{quote_number}/pdf")
+async def api_quote_pdf(request: Request, quote_number: str, download: bool = False):
+    """A stored quote as a PDF (streamed page by page, then cached)."""
+    return await _quote_document(request, quote_number, "pdf", download)
 
 
 @app.post("/api/takeoff")
-async def api_takeoff(payload: UploadTakeoffRequest):
+async def api_takeoff(payload: UploadTakeoffRequest, request: Request):
     """Simulate AI takeoff extraction from an uploaded schedule."""
-    result = simulate_ai_takeoff(payload.filename)
-    return result
+    async def compute():
+        return cached_takeoff(payload.filename)
+
+    result, outcome = await _coalesced(TAKEOFF_REQUESTS, request, compute)
+    return JSONResponse(result, headers=_replay_headers(outcome))
+
+
+@app.post("/api/takeoff/upload")
+async def api_takeoff_upload(request: Request):
+    """
+    Upload a schedule document (``multipart/form-data``, field ``file``) and
+    run takeoff extraction on it. The body is streamed to disk, never held
+    in memory; the result is cached under the document's SHA-256.
+    """
+    from app.uploads import UploadError, receive_upload
+
+    try:
+        upload = await receive_upload(request)
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+    try:
+        view = upload.document.view()
+        try:
+            return await run_in_threadpool(cached_takeoff, upload.filename, upload.digest, view)
+        finally:
+            view.release()
+    finally:
+        upload.close()
+
+
+@app.post("/api/takeoff/quote")
+async def api_takeoff_quote(payload: TakeoffQuoteRequest):
+    """Price a previously extracted takeoff without re-running extraction."""
+    takeoff = get_takeoff_cache().get(payload.digest)
+    if takeoff is None:
+        raise HTTPException(status_code=404, detail="Takeoff not cached; upload the schedule again")
+    items = apply_overrides(takeoff["extracted_items"], payload.glass_id, payload.finish_id)
+    try:
+        body = await ADMISSION.run(
+            "/api/takeoff/quote",
+            len(items),
+            quote_json,
+            payload.client_name,
+            payload.project_address,
+            items,
+        )
+    except (KeyError, TypeError, ValueError) as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return Response(content=body, media_type="application/json")
+
+
+@app.post("/api/takeoff/jobs", status_code=202)
+async def api_submit_takeoff_job(payload: TakeoffJobRequest):
+    """Queue takeoff extraction and pricing; returns a job id immediately."""
+    from app.jobs import QueueFull, get_job_queue
+
+    try:
+        job = get_job_queue().submit(
+            payload.filename,
+            client_name=payload.client_name,
+            project_address=payload.project_address,
+        )
+    except QueueFull as exc:
+        return JSONResponse(
+            {"detail": str(exc)},
+            status_code=503,
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    job_id = job["job_id"]
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "status_url": f"/api/takeoff/jobs/{job_id}",
+        "events_url": f"/api/takeoff/jobs/{job_id}/events",
+    }
+
+
+@app.get("/api/takeoff/jobs/{job_id}")
+async def api_takeoff_job(job_id: str):
+    """Status, partial takeoff and final quote of a takeoff job."""
+    from app.jobs import get_job_queue, job_view
+
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+
+@app.get("/api/takeoff/jobs/{job_id}/events")
+async def api_takeoff_job_events(job_id: str):
+    """Server-sent events with each status change of a takeoff job."""
+    from app.jobs import get_job_queue, job_events
+
+    store = get_job_queue().store
+    if store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(job_events(store, job_id), media_type="text/event-stream")
+
+
+@app.post("/api/match/sizes")
+async def api_match_sizes(payload: SizeMatchRequest):
+    """Map opening dimensions to the nearest (or next-larger) catalogue size."""
+    return {
+        "catalogue_version": get_size_index().version,
+        "matches": await ADMISSION.run(
+            "/api/match/sizes", len(payload.openings), match_sizes, payload.openings, payload.mode
+        ),
+    }
+
+
+@app.post("/api/match/schedule")
+async def api_match_schedule(payload: ScheduleMatchRequest):
+    """Turn schedule text rows into product, size, glass, finish and add-on selections."""
+    return {
+        "catalogue_version": get_text_index().version,
+        "rows": await ADMISSION.run("/api/match/schedule", len(payload.rows), match_schedule, payload.rows),
+    }
 
 
 @app.get("/api/products")
-async def api_products():
+async def api_products(request: Request):
     """Return the full product catalog."""
+    payloads = get_payloads()
+    return cached_response(request, payloads.products_body, payloads.products_etag, "application/json")
+
+
+@app.get("/api/catalogue")
+async def api_catalogue():
+    """The catalogue version being priced against and the price-list reload status."""
+    from app.price_lists import get_price_list_watcher
+
+    watcher = get_price_list_watcher()
     return {
-        "windows": WINDOW_TYPES,
-        "doors": DOOR_TYPES,
-        "glass_options": GLASS_OPTIONS,
-        "finish_options": FINISH_OPTIONS,
-        "addon_options": ADDON_OPTIONS,
+        "version": get_catalogue().version,
+        "price_list": watcher.status() if watcher is not None else None,
     }
+
+
+@app.get("/api/price-matrix")
+async def api_price_matrix(request: Request):
+    """Unit price for every product x size x glass x finish combination."""
+    payloads = get_payloads()
+    return cached_response(request, payloads.matrix_body, payloads.matrix_etag, "application/json")
+
+
+# ──────────────────────────────────────────────
+# Instrumentation (WD_METRICS=1)
+# ──────────────────────────────────────────────
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Request latencies, estimator stage timings and cache counters."""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/metrics/profile", include_in_schema=False)
+async def sampling_profile(seconds: float = 5.0, interval: float = 0.005):
+    """Sample all threads for ``seconds`` and return collapsed stacks for a flame graph."""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    seconds = min(max(seconds, 0.1), 60.0)
+    interval = min(max(interval, 0.001), 1.0)
+    stacks = await run_in_threadpool(metrics.sample_stacks, seconds, interval)
+    return PlainTextResponse(stacks)
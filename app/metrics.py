@@ -0,0 +1,261 @@
+"""
+Opt-in request and pricing instrumentation.
+
+Set ``WD_METRICS=1`` to turn it on. Then:
+
+- ``MetricsMiddleware`` records a latency histogram per method, route
+  template and status;
+- ``timed(stage)`` blocks around the estimator and takeoff stages record
+  ``wd_stage_duration_seconds`` (``validate``, ``lookup``, ``price``,
+  ``model``, ``serialise``, ``store``, ``quote_number``, ``takeoff``,
+  ``render``);
+- ``/metrics`` serves everything in the Prometheus text format, along with
+  the pricing and takeoff cache counters;
+- ``/metrics/profile`` samples every thread's stack for a few seconds and
+  returns collapsed stacks, ready for ``flamegraph.pl`` or speedscope.
+
+When disabled, ``timed`` returns a shared no-op context manager and the
+middleware is not installed, so the cost is one global lookup per stage.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import nullcontext
+
+ENABLED = os.environ.get("WD_METRICS", "") not in ("", "0")
+
+# Request and stage latencies range from microseconds to whole seconds.
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        names = self.labelnames + ("le",)
+        for labels, counts, total in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                yield f"{self.name}_bucket", _format_labels(names, labels + (_format_value(bound),)), running
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), running
+
+
+class Registry:
+    """Named metrics plus collectors that report gauges and counters on scrape."""
+
+    def __init__(self) -> None:
+        self._metrics: list = []
+        self._collectors: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect) -> None:
+        """
+        ``collect()`` returns ``(name, kind, help, value)`` tuples, read at
+        scrape time (used for state other modules already count).
+        """
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        for collect in self._collectors:
+            for name, kind, help, value in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "wd_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "wd_stage_duration_seconds",
+    "Time spent in each estimator and takeoff stage.",
+    ("stage",),
+))
+PRICED_LINES = REGISTRY.register(Counter(
+    "wd_priced_lines_total",
+    "Schedule lines priced by the batch engine.",
+))
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        STAGE_DURATION.observe(time.perf_counter() - self.start, self.stage)
+
+
+_NULL = nullcontext()
+
+
+def timed(stage: str):
+    """Context manager recording the block's duration under ``stage``."""
+    if not ENABLED:
+        return _NULL
+    return _Timer(stage)
+
+
+def count_lines(n: int) -> None:
+    if ENABLED:
+        PRICED_LINES.inc(n)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request by its matched route template."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            template = getattr(scope.get("route"), "path", None)
+            if template is None:
+                # Unmatched paths share one label so scans can't blow up cardinality.
+                template = "/static" if scope["path"].startswith("/static/") else "<unmatched>"
+            REQUEST_DURATION.observe(time.perf_counter() - start, scope["method"], template, str(status))
+
+
+# ──────────────────────────────────────────────
+# Sampling profiler
+# ──────────────────────────────────────────────
+
+def _stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample_stacks(seconds: float = 5.0, interval: float = 0.005) -> str:
+    """
+    Sample every other thread's Python stack for ``seconds`` and return the
+    counts in collapsed-stack format (``frame;frame;frame count`` per line).
+    """
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    tally: _Tally[str] = _Tally()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident != me:
+                tally[f"{names.get(ident, ident)};{_stack(frame)}"] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in tally.most_common())
@@ -4,7 +4,14 @@ Pydantic models for the W-D Estimating Agent.
 
 from __future__ import annotations
 
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, Field, model_validator
+
+from app.metrics import timed
+
+# A takeoff cache key: hex SHA-256 of the schedule document.
+DIGEST_PATTERN = r"^[0-9a-f]{64}$"
 
 
 class QuoteLineItem(BaseModel):
@@ -27,6 +34,17 @@ class QuoteRequest(BaseModel):
     project_address: str
     items: list[dict]
 
+    @model_validator(mode="wrap")
+    @classmethod
+    def _timed_validation(cls, data, handler):
+        with timed("validate"):
+            return handler(data)
+
+
+class QuoteSessionPatch(BaseModel):
+    """Add, remove or edit lines of a quote session."""
+    ops: list[dict]
+
 
 class QuoteResult(BaseModel):
     quote_number: str
@@ -36,8 +54,43 @@ class QuoteResult(BaseModel):
     subtotal: float
     gst: float
     total: float
+    catalogue_version: str
 
 
 class UploadTakeoffRequest(BaseModel):
     """Simulated AI takeoff extraction from uploaded schedule."""
     filename: str
+
+
+class TakeoffJobRequest(BaseModel):
+    """Queue a takeoff extraction and pricing job."""
+    filename: str
+    client_name: str = ""
+    project_address: str = ""
+
+
+class TakeoffQuoteRequest(BaseModel):
+    """Re-price a cached takeoff, optionally overriding glass and finish."""
+    digest: str = Field(pattern=DIGEST_PATTERN)
+    client_name: str
+    project_address: str
+    glass_id: str | None = None
+    finish_id: str | None = None
+
+
+class ScenarioRequest(BaseModel):
+    """One schedule priced across glass x finish overrides (``None`` = every option)."""
+    items: list[dict]
+    glass_ids: list[str] | None = None
+    finish_ids: list[str] | None = None
+
+
+class SizeMatchRequest(BaseModel):
+    """Openings (``width``/``height`` or ``size``, optional ``product_id``) to match to catalogue sizes."""
+    openings: list[dict]
+    mode: Literal["nearest", "next_larger"] = "nearest"
+
+
+class ScheduleMatchRequest(BaseModel):
+    """Schedule rows (text, or dicts with ``text`` plus fields to carry through) to match."""
+    rows: list[str | dict]
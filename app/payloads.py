@@ -0,0 +1,162 @@
+"""
+Pre-serialised catalogue payloads.
+
+The catalogue only changes when a new one is compiled, so everything the
+pages and ``/api/products`` send is serialised once per catalogue version
+and served as cached bytes with a strong ETag. Clients that already hold
+the current version get ``304 Not Modified`` without a body.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.catalogue import Catalogue, get_catalogue
+from app.metrics import timed
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag for a response body."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def build_price_matrix(catalogue: Catalogue) -> dict:
+    """
+    Unit price of every product x size x glass x finish combination.
+
+    ``products[product_id][size][glass][finish]`` follows the order of
+    ``glass_ids`` and ``finish_ids``. Add-ons are listed separately with the
+    products they apply to, since they are a flat amount on top.
+    """
+    multipliers = [g["multiplier"] for g in catalogue.glass_options]
+    surcharges = [f["surcharge"] for f in catalogue.finish_options]
+    prices = {}
+    for product, base_prices in zip(catalogue.products, catalogue.base_prices):
+        prices.setdefault(product["id"], [
+            [[base * m + s for s in surcharges] for m in multipliers]
+            for base in base_prices
+        ])
+    return {
+        "catalogue_version": catalogue.version,
+        "glass_ids": [g["id"] for g in catalogue.glass_options],
+        "finish_ids": [f["id"] for f in catalogue.finish_options],
+        "addons": {
+            addon["id"]: {
+                "price": addon["price"],
+                "products": [
+                    pid for pid, applicable in catalogue.applicable_addons.items()
+                    if addon["id"] in applicable
+                ],
+            }
+            for addon in catalogue.addon_options
+        },
+        "products": prices,
+    }
+
+
+class CataloguePayloads:
+    """Serialised catalogue payloads for a single catalogue version."""
+
+    __slots__ = (
+        "version",
+        "products_json",
+        "glass_json",
+        "finish_json",
+        "addon_json",
+        "matrix_json",
+        "products_body",
+        "products_etag",
+        "matrix_body",
+        "matrix_etag",
+        "pages",
+    )
+
+    def __init__(self, catalogue: Catalogue) -> None:
+        self.version = catalogue.version
+        self.products_json = _dumps(list(catalogue.products))
+        self.glass_json = _dumps(list(catalogue.glass_options))
+        self.finish_json = _dumps(list(catalogue.finish_options))
+        self.addon_json = _dumps(list(catalogue.addon_options))
+        self.matrix_json = _dumps(build_price_matrix(catalogue))
+
+        self.products_body = _dumps({
+            "windows": [p for p in catalogue.products if p["category"] == "windows"],
+            "doors": [p for p in catalogue.products if p["category"] == "doors"],
+            "glass_options": list(catalogue.glass_options),
+            "finish_options": list(catalogue.finish_options),
+            "addon_options": list(catalogue.addon_options),
+        }).encode("utf-8")
+        self.products_etag = make_etag(self.products_body)
+        self.matrix_body = self.matrix_json.encode("utf-8")
+        self.matrix_etag = make_etag(self.matrix_body)
+
+        # Rendered pages, filled in lazily by ``render_page``.
+        self.pages: dict[str, tuple[bytes, str]] = {}
+
+
+_payloads: CataloguePayloads | None = None
+
+
+def get_payloads() -> CataloguePayloads:
+    """Payloads for the current catalogue, rebuilt when its version changes."""
+    global _payloads
+    catalogue = get_catalogue()
+    payloads = _payloads
+    if payloads is None or payloads.version != catalogue.version:
+        payloads = CataloguePayloads(catalogue)
+        _payloads = payloads
+    return payloads
+
+
+def render_page(name: str, render) -> tuple[bytes, str]:
+    """
+    Rendered body and ETag for a catalogue-only page.
+
+    ``render`` is called with the current payloads the first time a page is
+    requested for a catalogue version and must return the HTML string.
+    """
+    payloads = get_payloads()
+    page = payloads.pages.get(name)
+    if page is None:
+        with timed("render"):
+            body = render(payloads).encode("utf-8")
+        page = (body, make_etag(body))
+        payloads.pages[name] = page
+    return page
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True if the client already holds the representation tagged ``etag``."""
+    return _etag_matches(request.headers.get("if-none-match"), etag)
+
+
+def cached_response(
+    request: Request,
+    body: bytes,
+    etag: str,
+    media_type: str,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """Serve pre-serialised bytes, or 304 if the client's copy is current."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(headers or {})}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
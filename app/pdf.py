@@ -0,0 +1,197 @@
+"""
+Minimal streaming PDF writer.
+
+Enough of PDF 1.4 to lay out text documents such as quotes, in pure Python
+with no dependencies: the standard Helvetica and Helvetica-Bold fonts (which
+every viewer provides, so nothing is embedded), text, lines and filled
+rectangles, and Flate-compressed page content.
+
+``PdfWriter`` emits the file incrementally. ``begin()`` returns the header,
+each ``page()`` returns that page's objects as soon as it is laid out, and
+``finish()`` writes the page tree, cross-reference table and trailer. A
+thousand-page document is never held in memory.
+"""
+
+from __future__ import annotations
+
+import zlib
+from functools import lru_cache
+
+A4 = (595.28, 841.89)
+
+# Advance widths (1/1000 em) of ASCII 32-126 in the standard 14 fonts.
+_HELVETICA = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_HELVETICA_BOLD = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+# Used for characters outside ASCII.
+_DEFAULT_WIDTH = 556
+
+REGULAR = "F1"
+BOLD = "F2"
+_FONTS = {REGULAR: "Helvetica", BOLD: "Helvetica-Bold"}
+# Width of every WinAnsi byte, per font.
+_WIDTHS = {
+    font: tuple(widths[code - 32] if 32 <= code < 32 + len(widths) else _DEFAULT_WIDTH for code in range(256))
+    for font, widths in ((REGULAR, _HELVETICA), (BOLD, _HELVETICA_BOLD))
+}
+
+
+def _encode(text: str) -> bytes:
+    # Standard fonts use WinAnsiEncoding, which is close to cp1252.
+    return text.encode("cp1252", "replace")
+
+
+@lru_cache(maxsize=8192)
+def text_width(text: str, size: float, font: str = REGULAR) -> float:
+    """Width of ``text`` in points."""
+    return sum(map(_WIDTHS[font].__getitem__, _encode(text))) * size / 1000
+
+
+@lru_cache(maxsize=8192)
+def fit_text(text: str, width: float, size: float, font: str = REGULAR) -> str:
+    """``text`` cut down with "..." so it fits in ``width`` points."""
+    if text_width(text, size, font) <= width:
+        return text
+    widths = _WIDTHS[font]
+    budget = (width - text_width("...", size, font)) * 1000 / size
+    used = 0
+    for end, code in enumerate(_encode(text)):
+        used += widths[code]
+        if used > budget:
+            return text[:end].rstrip() + "..."
+    return text
+
+
+@lru_cache(maxsize=8192)
+def _literal(text: str) -> bytes:
+    raw = _encode(text)
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _colour(rgb: tuple[float, float, float]) -> bytes:
+    return b"%.3f %.3f %.3f" % rgb
+
+
+class Canvas:
+    """Drawing operations for one page; y is measured up from the bottom."""
+
+    def __init__(self) -> None:
+        self._ops: list[bytes] = []
+
+    def text(
+        self,
+        x: float,
+        y: float,
+        text: str,
+        size: float = 9,
+        font: str = REGULAR,
+        colour: tuple[float, float, float] = (0, 0, 0),
+        align: str = "left",
+    ) -> None:
+        if align == "right":
+            x -= text_width(text, size, font)
+        self._ops.append(
+            b"BT /%s %.2f Tf %s rg %.2f %.2f Td %s Tj ET"
+            % (font.encode(), size, _colour(colour), x, y, _literal(text))
+        )
+
+    def row(self, y: float, cells, size: float = 9, font: str = REGULAR, colour=(0, 0, 0)) -> None:
+        """
+        Several ``(x, text, align)`` cells on one baseline, in one text
+        object (cheaper than a ``text`` call per cell).
+        """
+        ops = [b"BT /%s %.2f Tf %s rg" % (font.encode(), size, _colour(colour))]
+        for x, text, align in cells:
+            if align == "right":
+                x -= text_width(text, size, font)
+            ops.append(b"1 0 0 1 %.2f %.2f Tm %s Tj" % (x, y, _literal(text)))
+        ops.append(b"ET")
+        self._ops.append(b" ".join(ops))
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, width: float = 0.5, colour=(0.8, 0.8, 0.8)) -> None:
+        self._ops.append(b"%.2f w %s RG %.2f %.2f m %.2f %.2f l S" % (width, _colour(colour), x1, y1, x2, y2))
+
+    def rect(self, x: float, y: float, width: float, height: float, colour=(0.95, 0.95, 0.95)) -> None:
+        self._ops.append(b"%s rg %.2f %.2f %.2f %.2f re f" % (_colour(colour), x, y, width, height))
+
+    def content(self) -> bytes:
+        return b"\n".join(self._ops)
+
+
+class PdfWriter:
+    """Writes a PDF one page at a time; every method returns the bytes to emit."""
+
+    # Fixed object numbers; pages and their content streams follow.
+    _CATALOG = 1
+    _PAGES = 2
+    _FONT_OBJECTS = {REGULAR: 3, BOLD: 4}
+
+    def __init__(self, page_size: tuple[float, float] = A4) -> None:
+        self.page_size = page_size
+        self._offset = 0
+        self._offsets: dict[int, int] = {}
+        self._next = 5
+        self._pages: list[int] = []
+
+    def _object(self, number: int, body: bytes) -> bytes:
+        self._offsets[number] = self._offset
+        data = b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        self._offset += len(data)
+        return data
+
+    def _emit(self, data: bytes) -> bytes:
+        self._offset += len(data)
+        return data
+
+    def begin(self) -> bytes:
+        out = [self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")]
+        out.append(self._object(self._CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % self._PAGES))
+        for font, number in self._FONT_OBJECTS.items():
+            out.append(self._object(number, (
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>"
+                % _FONTS[font].encode()
+            )))
+        return b"".join(out)
+
+    def page(self, canvas: Canvas) -> bytes:
+        stream = zlib.compress(canvas.content(), 6)
+        content_number, page_number = self._next, self._next + 1
+        self._next += 2
+        self._pages.append(page_number)
+        fonts = b" ".join(b"/%s %d 0 R" % (font.encode(), n) for font, n in self._FONT_OBJECTS.items())
+        return self._object(
+            content_number,
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(stream), stream),
+        ) + self._object(page_number, (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Resources << /Font << %s >> >> /Contents %d 0 R >>"
+            % (self._PAGES, self.page_size[0], self.page_size[1], fonts, content_number)
+        ))
+
+    def finish(self, title: str = "") -> bytes:
+        kids = b" ".join(b"%d 0 R" % n for n in self._pages)
+        out = [self._object(self._PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._pages)))]
+        info = self._next
+        self._next += 1
+        out.append(self._object(info, b"<< /Title %s /Producer (W-D Estimating Agent) >>" % _literal(title)))
+        xref_at = self._offset
+        rows = [b"xref\n0 %d\n0000000000 65535 f \n" % self._next]
+        rows += [b"%010d 00000 n \n" % self._offsets[n] for n in range(1, self._next)]
+        rows.append(
+            b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (self._next, self._CATALOG, info, xref_at)
+        )
+        out.append(self._emit(b"".join(rows)))
+        return b"".join(out)
@@ -0,0 +1,141 @@
+"""
+Portfolio re-quoting across a process pool.
+
+Re-prices many ``QuoteRequest`` payloads (one JSON object per line) in
+parallel. The compiled catalogue is pickled once per worker at pool
+start-up rather than with every task, and results come back in input
+order as they complete:
+
+    python -m app.portfolio requests.jsonl -o quotes.jsonl --workers 8
+
+Each output line is either the ``QuoteResult`` JSON for the matching input
+line or ``{"line": n, "error": "..."}``. Per-worker throughput is printed
+to stderr when the run finishes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from app.catalogue import Catalogue, get_catalogue, set_catalogue
+from app.estimator import generate_quote_json
+from app.models import QuoteRequest
+
+
+def _init_worker(catalogue: Catalogue) -> None:
+    set_catalogue(catalogue)
+
+
+def _quote_chunk(chunk: list[tuple[int, str]]) -> tuple[list[bytes], int, int, float]:
+    """Price a chunk of raw request lines; returns results and worker stats."""
+    started = time.perf_counter()
+    results = []
+    lines = 0
+    for number, raw in chunk:
+        try:
+            request = QuoteRequest.model_validate_json(raw)
+            results.append(generate_quote_json(
+                client_name=request.client_name,
+                project_address=request.project_address,
+                items=request.items,
+            ))
+            lines += len(request.items)
+        except (KeyError, TypeError, ValueError) as exc:
+            results.append(json.dumps({"line": number, "error": str(exc)}).encode("utf-8"))
+    return results, os.getpid(), lines, time.perf_counter() - started
+
+
+def _chunks(raw_lines: Iterable[str], size: int) -> Iterator[list[tuple[int, str]]]:
+    chunk = []
+    for number, raw in enumerate(raw_lines, start=1):
+        if not raw.strip():
+            continue
+        chunk.append((number, raw))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def quote_portfolio(
+    raw_lines: Iterable[str],
+    workers: int | None = None,
+    chunksize: int = 8,
+    stats: dict[int, dict] | None = None,
+    catalogue: Catalogue | None = None,
+) -> Iterator[bytes]:
+    """
+    Price JSONL ``QuoteRequest`` lines on a process pool, yielding results in order.
+
+    At most a few chunks per worker are in flight, so input is read and
+    output produced as a stream. If ``stats`` is given it is filled with
+    ``{pid: {"quotes", "lines", "busy_s"}}`` per worker.
+    """
+    workers = workers or os.cpu_count() or 1
+    catalogue = catalogue or get_catalogue()
+    window = workers * 4
+    pending: deque = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(catalogue,)) as pool:
+        for chunk in _chunks(raw_lines, chunksize):
+            pending.append(pool.submit(_quote_chunk, chunk))
+            if len(pending) >= window:
+                yield from _collect(pending.popleft(), stats)
+        while pending:
+            yield from _collect(pending.popleft(), stats)
+
+
+def _collect(future, stats: dict[int, dict] | None) -> list[bytes]:
+    results, pid, lines, busy = future.result()
+    if stats is not None:
+        worker = stats.setdefault(pid, {"quotes": 0, "lines": 0, "busy_s": 0.0})
+        worker["quotes"] += len(results)
+        worker["lines"] += lines
+        worker["busy_s"] += busy
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-price a portfolio of quote requests in parallel.")
+    parser.add_argument("input", help="JSONL file of QuoteRequest payloads ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file ('-' for stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=8, help="requests per task sent to a worker")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    stats: dict[int, dict] = {}
+    started = time.perf_counter()
+    count = 0
+    try:
+        for result in quote_portfolio(source, workers=args.workers, chunksize=args.chunksize, stats=stats):
+            sink.write(result + b"\n")
+            count += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout.buffer:
+            sink.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{count} quotes in {elapsed:.2f}s ({count / elapsed if elapsed else 0:,.1f} quotes/s)", file=sys.stderr)
+    for pid, worker in sorted(stats.items()):
+        rate = worker["lines"] / worker["busy_s"] if worker["busy_s"] else 0.0
+        print(
+            f"  worker {pid}: {worker['quotes']} quotes, {worker['lines']} lines, "
+            f"{worker['busy_s']:.2f}s busy, {rate:,.0f} lines/s",
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+Hot-reloadable price lists.
+
+Prices used to change only with a redeploy of ``app/products.py``. Point
+``WD_PRICE_LIST`` at a price-list file and the catalogue is loaded from it
+instead, then reloaded whenever the file changes (checked every
+``WD_PRICE_LIST_POLL`` seconds, default 5):
+
+- ``.json``: a whole catalogue, in the same shape as
+  ``app/catalogue_snapshot.json`` (``products``, ``glass_options``,
+  ``finish_options``, ``addon_options``);
+- ``.csv``: price changes applied on top of ``app/products.py``, one per
+  row with columns ``kind,id,size,price``. ``kind`` is ``product`` (``size``
+  is the size label or index, ``price`` its base price), ``glass``
+  (``price`` is the multiplier), ``finish`` (the surcharge) or ``addon``.
+
+A new version is read, validated, compiled and test-priced (a line for
+every product size, with all its add-ons) on the watcher thread, then
+made current with a single reference swap (``set_catalogue``). Pricing
+never takes a lock: each quote reads the current ``Catalogue`` once and
+finishes on that version, which its ``QuoteResult.catalogue_version``
+records. A file that fails validation is rejected and the current version
+keeps serving; the error is reported by ``GET /api/catalogue``.
+
+Check a file before shipping it with ``python -m app.price_lists FILE``.
+"""
+
+from __future__ import annotations
+
+import copy
+import csv
+import json
+import math
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from app.batch import BatchQuote, compile_schedule
+from app.catalogue import Catalogue, compile_catalogue, load_snapshot, set_catalogue
+from app.metrics import REGISTRY, Counter
+
+RELOADS = REGISTRY.register(Counter(
+    "wd_catalogue_reloads_total",
+    "Price-list loads by outcome.",
+    ("outcome",),
+))
+
+CSV_COLUMNS = ("kind", "id", "size", "price")
+
+# Loads kept in the history reported by ``PriceListWatcher.status``.
+HISTORY = 10
+
+
+class PriceListError(ValueError):
+    """A price list that cannot be read or fails validation."""
+
+
+def _number(value, what: str, minimum: float = 0.0, allow_equal: bool = True) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise PriceListError(f"{what} must be a number, got {value!r}")
+    if value < minimum or (value == minimum and not allow_equal):
+        raise PriceListError(f"{what} must be {'at least' if allow_equal else 'more than'} {minimum:g}, got {value!r}")
+    return value
+
+
+def _unique_ids(entries, section: str) -> None:
+    if not isinstance(entries, list) or not entries:
+        raise PriceListError(f"{section} must be a non-empty list")
+    seen = set()
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("id"), str) or not entry["id"]:
+            raise PriceListError(f"Every entry in {section} needs a string id")
+        if not isinstance(entry.get("name"), str):
+            raise PriceListError(f"{section} {entry['id']} needs a name")
+        if entry["id"] in seen:
+            raise PriceListError(f"Duplicate id in {section}: {entry['id']}")
+        seen.add(entry["id"])
+
+
+def validate_sections(products, glass_options, finish_options, addon_options) -> None:
+    """Raise ``PriceListError`` unless the sections form a priceable catalogue."""
+    _unique_ids(products, "products")
+    _unique_ids(glass_options, "glass_options")
+    _unique_ids(finish_options, "finish_options")
+    if not isinstance(addon_options, list):
+        raise PriceListError("addon_options must be a list")
+    if addon_options:
+        _unique_ids(addon_options, "addon_options")
+
+    for product in products:
+        pid = product["id"]
+        if not isinstance(product.get("category"), str):
+            raise PriceListError(f"Product {pid} needs a category")
+        sizes = product.get("sizes")
+        if not isinstance(sizes, list) or not sizes:
+            raise PriceListError(f"Product {pid} needs at least one size")
+        for index, size in enumerate(sizes):
+            if not isinstance(size, dict) or not isinstance(size.get("label"), str):
+                raise PriceListError(f"Size {index} of {pid} needs a label")
+            _number(size.get("width"), f"{pid} size {size['label']!r} width", 0, allow_equal=False)
+            _number(size.get("height"), f"{pid} size {size['label']!r} height", 0, allow_equal=False)
+            _number(size.get("base_price"), f"{pid} size {size['label']!r} base_price")
+    for glass in glass_options:
+        _number(glass.get("multiplier"), f"Glass {glass['id']} multiplier", 0, allow_equal=False)
+    for finish in finish_options:
+        _number(finish.get("surcharge"), f"Finish {finish['id']} surcharge")
+    for addon in addon_options:
+        _number(addon.get("price"), f"Add-on {addon['id']} price")
+        applies_to = addon.get("applies_to")
+        if not isinstance(applies_to, list) or not all(isinstance(c, str) for c in applies_to):
+            raise PriceListError(f"Add-on {addon['id']} applies_to must be a list of categories")
+
+
+def check_prices(catalogue: Catalogue) -> None:
+    """
+    Raise ``PriceListError`` unless ``catalogue`` can price a line for every
+    product size with every applicable add-on, so a catalogue that passes
+    validation but breaks pricing never goes live.
+    """
+    items = [
+        {
+            "product_id": product["id"],
+            "size_index": size_index,
+            "quantity": 1,
+            "addon_ids": sorted(catalogue.applicable_addons[product["id"]]),
+        }
+        for product in catalogue.products
+        for size_index in range(len(product["sizes"]))
+    ]
+    try:
+        BatchQuote(compile_schedule(items, catalogue))
+    except Exception as exc:
+        raise PriceListError(f"Catalogue fails a test quote: {exc!r}") from exc
+
+
+def _read_json(path: Path) -> dict:
+    try:
+        document = json.loads(path.read_bytes())
+    except ValueError as exc:
+        raise PriceListError(f"{path.name} is not valid JSON: {exc}") from exc
+    if not isinstance(document, dict):
+        raise PriceListError(f"{path.name} must hold a JSON object")
+    return {
+        section: document.get(section)
+        for section in ("products", "glass_options", "finish_options", "addon_options")
+    }
+
+
+def _read_csv(path: Path, base: Catalogue) -> dict:
+    sections = {
+        "products": copy.deepcopy(list(base.products)),
+        "glass_options": copy.deepcopy(list(base.glass_options)),
+        "finish_options": copy.deepcopy(list(base.finish_options)),
+        "addon_options": copy.deepcopy(list(base.addon_options)),
+    }
+    products = {p["id"]: p for p in sections["products"]}
+    options = {
+        "glass": ({g["id"]: g for g in sections["glass_options"]}, "multiplier"),
+        "finish": ({f["id"]: f for f in sections["finish_options"]}, "surcharge"),
+        "addon": ({a["id"]: a for a in sections["addon_options"]}, "price"),
+    }
+
+    with path.open(newline="", encoding="utf-8-sig") as handle:
+        reader = csv.DictReader(handle)
+        missing = set(CSV_COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            raise PriceListError(f"{path.name} is missing columns: {', '.join(sorted(missing))}")
+        for row in reader:
+            where = f"{path.name} line {reader.line_num}"
+            kind = (row["kind"] or "").strip().lower()
+            entry_id = (row["id"] or "").strip()
+            try:
+                price = float(row["price"])
+            except (TypeError, ValueError):
+                raise PriceListError(f"{where}: price {row['price']!r} is not a number") from None
+            if kind == "product":
+                product = products.get(entry_id)
+                if product is None:
+                    raise PriceListError(f"{where}: unknown product {entry_id}")
+                size = _find_size(product, (row["size"] or "").strip())
+                if size is None:
+                    raise PriceListError(f"{where}: {entry_id} has no size {row['size']!r}")
+                size["base_price"] = price
+            elif kind in options:
+                entries, field = options[kind]
+                if entry_id not in entries:
+                    raise PriceListError(f"{where}: unknown {kind} {entry_id}")
+                entries[entry_id][field] = price
+            else:
+                raise PriceListError(f"{where}: kind must be product, glass, finish or addon, got {kind!r}")
+    return sections
+
+
+def _find_size(product: dict, size: str) -> dict | None:
+    for index, candidate in enumerate(product["sizes"]):
+        if size == candidate["label"] or size == str(index):
+            return candidate
+    return None
+
+
+def base_catalogue() -> Catalogue:
+    """The catalogue from ``app/products.py`` (via its snapshot if current)."""
+    return load_snapshot() or compile_catalogue()
+
+
+def read_price_list(path: str | Path, base: Catalogue | None = None) -> Catalogue:
+    """
+    Read, validate and compile a price list into a new ``Catalogue``.
+
+    CSV price changes are applied to ``base`` (default: ``app/products.py``).
+    Raises ``PriceListError`` if the file is unreadable or invalid.
+    """
+    path = Path(path)
+    try:
+        if path.suffix.lower() == ".csv":
+            sections = _read_csv(path, base or base_catalogue())
+        elif path.suffix.lower() == ".json":
+            sections = _read_json(path)
+        else:
+            raise PriceListError(f"Price list must be a .json or .csv file, got {path.name}")
+    except OSError as exc:
+        raise PriceListError(f"Cannot read price list: {exc}") from exc
+    except UnicodeDecodeError as exc:
+        raise PriceListError(f"{path.name} is not UTF-8 text (save it as UTF-8 CSV): {exc}") from exc
+    except csv.Error as exc:
+        raise PriceListError(f"{path.name} is not valid CSV: {exc}") from exc
+    validate_sections(**sections)
+    catalogue = Catalogue(**sections)
+    check_prices(catalogue)
+    return catalogue
+
+
+class PriceListWatcher:
+    """Reloads the catalogue from a price-list file when it changes."""
+
+    def __init__(self, path: str | Path, interval: float = 5.0, base: Catalogue | None = None) -> None:
+        self.path = Path(path)
+        self.interval = interval
+        self.base = base or base_catalogue()
+        self.current = self.base
+        self.last_error: str | None = None
+        self.history: list[dict] = []
+        self._stamp: tuple[int, int] | None = None
+        self._thread: threading.Thread | None = None
+
+    def _file_stamp(self) -> tuple[int, int] | None:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self) -> bool:
+        """Load the file if it changed since the last check; True if a new version went live."""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            catalogue = read_price_list(self.path, self.base)
+        except PriceListError as exc:
+            self.last_error = str(exc)
+            RELOADS.inc(1, "rejected")
+            return False
+        self.last_error = None
+        if catalogue.version == self.current.version:
+            RELOADS.inc(1, "unchanged")
+            return False
+        # The whole catalogue is built; going live is one reference swap.
+        set_catalogue(catalogue)
+        self.current = catalogue
+        self.history.append({"version": catalogue.version, "loaded_at": time.time()})
+        del self.history[:-HISTORY]
+        RELOADS.inc(1, "loaded")
+        return True
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="price-list-watcher", daemon=True)
+            self._thread.start()
+
+    def poll(self) -> None:
+        """``check``, counting an unexpected failure as a rejection instead of raising."""
+        try:
+            self.check()
+        except Exception as exc:
+            self.last_error = f"Cannot load price list: {exc!r}"
+            RELOADS.inc(1, "rejected")
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            self.poll()
+
+    def status(self) -> dict:
+        return {
+            "source": str(self.path),
+            "version": self.current.version,
+            "last_error": self.last_error,
+            "history": list(self.history),
+        }
+
+
+_watcher: PriceListWatcher | None = None
+_watcher_lock = threading.Lock()
+
+
+def get_price_list_watcher() -> PriceListWatcher | None:
+    """The watcher for ``WD_PRICE_LIST``, or ``None`` if no price list is configured."""
+    return _watcher
+
+
+def watch_price_list(path: str | Path, base: Catalogue | None = None) -> Catalogue:
+    """
+    Load ``path`` now and keep watching it; returns the catalogue to start on
+    (``base`` if the file is missing or invalid).
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            interval = float(os.environ.get("WD_PRICE_LIST_POLL", "5"))
+            watcher = PriceListWatcher(path, interval, base)
+            watcher.poll()
+            watcher.start()
+            _watcher = watcher
+        return _watcher.current
+
+
+def _collect() -> list[tuple]:
+    if _watcher is None:
+        return []
+    return [
+        ("wd_catalogue_reload_failing", "gauge", "1 while the price list on disk is rejected.", int(_watcher.last_error is not None)),
+    ]
+
+
+REGISTRY.add_collector(_collect)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m app.price_lists PRICE_LIST.json|.csv")
+    try:
+        checked = read_price_list(sys.argv[1])
+    except PriceListError as exc:
+        sys.exit(f"invalid: {exc}")
+    print(json.dumps({
+        "version": checked.version,
+        "products": len(checked.products),
+        "glass_options": len(checked.glass_options),
+        "finish_options": len(checked.finish_options),
+        "addon_options": len(checked.addon_options),
+    }, indent=2))
@@ -0,0 +1,137 @@
+"""
+Collision-free quote number allocation.
+
+Quote numbers keep the ``BLS-WD-YYMMDD-`` prefix. The suffix is an
+instance tag followed by a per-day sequence (base 36, at least three
+characters, growing past ``ZZZ`` instead of wrapping), e.g.
+``BLS-WD-250226-K7Q2M9XB00A``.
+
+Processes reserve blocks of sequence numbers from a shared SQLite counter
+and hand them out locally, so the database is touched once per block and
+the hot path only takes a per-process lock. Every process that shares the
+counter file (``WD_QUOTE_SEQ_DB``, default in the system temp dir) gets
+unique sequence numbers.
+
+The counter only makes numbers unique within one host. Serverless
+instances each have their own temp dir, so their counters all start at
+zero. The instance tag keeps their numbers apart: eight random base-36
+characters (about 2.8e12 values) drawn from ``secrets`` when the allocator
+is created, so even thousands of cold starts a day are unlikely to share
+one. Set ``WD_QUOTE_INSTANCE`` to a fixed tag per host, or to an empty
+string when every instance shares one counter file. The quote store still
+rejects a number it already holds (see ``QuoteStore.save``).
+"""
+
+from __future__ import annotations
+
+import os
+import secrets
+import sqlite3
+import string
+import tempfile
+import threading
+from datetime import datetime
+
+_ALPHABET = string.digits + string.ascii_uppercase
+
+# Characters in a random instance tag.
+INSTANCE_TAG_WIDTH = 8
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quote_sequences (
+    day TEXT PRIMARY KEY,
+    next INTEGER NOT NULL
+)
+"""
+
+
+def _base36(n: int, width: int = 3) -> str:
+    digits = []
+    while n:
+        n, r = divmod(n, 36)
+        digits.append(_ALPHABET[r])
+    return "".join(reversed(digits)).rjust(width, "0")
+
+
+def _random_tag() -> str:
+    return _base36(secrets.randbelow(36**INSTANCE_TAG_WIDTH), INSTANCE_TAG_WIDTH)
+
+
+class QuoteNumberAllocator:
+    """Hands out unique quote numbers from blocks reserved in a shared counter."""
+
+    def __init__(self, path: str, block_size: int = 64, instance: str | None = None) -> None:
+        self.path = path
+        self.block_size = block_size
+        self.instance = instance if instance is not None else _random_tag()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._day = None
+        self._next = 0
+        self._end = 0
+        conn = self._connect()
+        try:
+            conn.execute(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _reserve(self, day: str) -> int:
+        """Claim the next block for ``day``; returns its first sequence number."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT next FROM quote_sequences WHERE day = ?", (day,)).fetchone()
+            start = row[0] if row else 0
+            conn.execute(
+                "INSERT OR REPLACE INTO quote_sequences (day, next) VALUES (?, ?)",
+                (day, start + self.block_size),
+            )
+            conn.execute("COMMIT")
+            return start
+        finally:
+            conn.close()
+
+    def allocate(self) -> str:
+        """Next quote number, e.g. ``BLS-WD-250226-K7Q2M9XB00A``."""
+        day = datetime.now().strftime("%y%m%d")
+        pid = os.getpid()
+        with self._lock:
+            # A forked child must not reuse its parent's block.
+            if day != self._day or pid != self._pid or self._next >= self._end:
+                self._next = self._reserve(day)
+                self._end = self._next + self.block_size
+                self._day = day
+                self._pid = pid
+            sequence = self._next
+            self._next += 1
+        return f"BLS-WD-{day}-{self.instance}{_base36(sequence)}"
+
+
+_allocator: QuoteNumberAllocator | None = None
+_allocator_lock = threading.Lock()
+
+
+def get_quote_number_allocator() -> QuoteNumberAllocator:
+    """The process-wide allocator, opened on first use."""
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = QuoteNumberAllocator(
+                    os.environ.get(
+                        "WD_QUOTE_SEQ_DB",
+                        os.path.join(tempfile.gettempdir(), "wd-quote-sequence.sqlite3"),
+                    ),
+                    instance=os.environ.get("WD_QUOTE_INSTANCE"),
+                )
+    return _allocator
+
+
+def next_quote_number() -> str:
+    """Allocate a new, unique quote number."""
+    return get_quote_number_allocator().allocate()
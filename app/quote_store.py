@@ -0,0 +1,249 @@
+"""
+Persistent quote repository backed by embedded SQLite.
+
+Each generated quote is stored once as its zlib-compressed ``QuoteResult``
+JSON document, alongside the summary columns the common lookups need.
+Reading a quote back is a primary-key hit plus one decompress, with no
+re-pricing and no JSON round trip, so it stays flat as history grows.
+
+A quote number is stored once: ``save`` refuses a number that is already
+taken (``DuplicateQuoteNumber``) rather than overwriting another client's
+quote. A session re-saving its own quote goes through ``update``.
+
+Search is by case-insensitive prefix of client name or project address,
+date range and total range, newest first, with keyset pagination so deep
+pages cost the same as the first.
+
+The database lives at ``WD_QUOTE_DB`` (default: ``wd-quotes.sqlite3`` in
+the system temp dir, the only writable location on serverless hosts).
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    quote_number TEXT PRIMARY KEY,
+    client_name TEXT NOT NULL,
+    client_key TEXT NOT NULL,
+    project_address TEXT NOT NULL,
+    address_key TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    line_count INTEGER NOT NULL,
+    subtotal REAL NOT NULL,
+    gst REAL NOT NULL,
+    total REAL NOT NULL,
+    document BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quotes_created ON quotes (created_at, quote_number);
+CREATE INDEX IF NOT EXISTS quotes_client ON quotes (client_key, created_at);
+CREATE INDEX IF NOT EXISTS quotes_address ON quotes (address_key, created_at);
+CREATE INDEX IF NOT EXISTS quotes_total ON quotes (total);
+"""
+
+_SUMMARY_COLUMNS = (
+    "quote_number",
+    "client_name",
+    "project_address",
+    "created_at",
+    "line_count",
+    "subtotal",
+    "gst",
+    "total",
+)
+
+MAX_PAGE_SIZE = 200
+
+
+class DuplicateQuoteNumber(Exception):
+    """A quote is already stored under this quote number."""
+
+
+def _key(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _day_start(date: str) -> float:
+    return datetime.strptime(date, "%Y-%m-%d").timestamp()
+
+
+class QuoteStore:
+    """SQLite-backed store of generated quotes."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(
+        self,
+        quote_number: str,
+        client_name: str,
+        project_address: str,
+        subtotal: float,
+        gst: float,
+        total: float,
+        line_count: int,
+        document: bytes,
+        created_at: float | None = None,
+    ) -> None:
+        """
+        Store a new quote's JSON document.
+
+        Raises ``DuplicateQuoteNumber`` if the number is already taken.
+        """
+        try:
+            self._connect().execute(
+                "INSERT INTO quotes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    quote_number,
+                    client_name,
+                    _key(client_name),
+                    project_address,
+                    _key(project_address),
+                    time.time() if created_at is None else created_at,
+                    line_count,
+                    subtotal,
+                    gst,
+                    total,
+                    zlib.compress(document, 6),
+                ),
+            )
+        except sqlite3.IntegrityError as exc:
+            raise DuplicateQuoteNumber(quote_number) from exc
+
+    def update(
+        self,
+        quote_number: str,
+        client_name: str,
+        project_address: str,
+        subtotal: float,
+        gst: float,
+        total: float,
+        line_count: int,
+        document: bytes,
+    ) -> bool:
+        """Replace the document of a quote already stored; False if there is none."""
+        cursor = self._connect().execute(
+            "UPDATE quotes SET client_name = ?, client_key = ?, project_address = ?, address_key = ?, "
+            "line_count = ?, subtotal = ?, gst = ?, total = ?, document = ? WHERE quote_number = ?",
+            (
+                client_name,
+                _key(client_name),
+                project_address,
+                _key(project_address),
+                line_count,
+                subtotal,
+                gst,
+                total,
+                zlib.compress(document, 6),
+                quote_number,
+            ),
+        )
+        return cursor.rowcount > 0
+
+    def get_document(self, quote_number: str) -> bytes | None:
+        """The stored ``QuoteResult`` JSON for a quote number."""
+        row = self._connect().execute(
+            "SELECT document FROM quotes WHERE quote_number = ?", (quote_number,)
+        ).fetchone()
+        return None if row is None else zlib.decompress(row[0])
+
+    def get_record(self, quote_number: str) -> tuple[bytes, float] | None:
+        """The stored JSON for a quote number and when it was saved."""
+        row = self._connect().execute(
+            "SELECT document, created_at FROM quotes WHERE quote_number = ?", (quote_number,)
+        ).fetchone()
+        return None if row is None else (zlib.decompress(row[0]), row[1])
+
+    def search(
+        self,
+        client: str | None = None,
+        address: str | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        min_total: float | None = None,
+        max_total: float | None = None,
+        limit: int = 50,
+        cursor: str | None = None,
+    ) -> dict:
+        """
+        Quote summaries matching every given filter, newest first.
+
+        ``client`` and ``address`` match case-insensitive prefixes; dates are
+        inclusive ``YYYY-MM-DD`` days. Pass the returned ``next_cursor`` to
+        fetch the following page.
+        """
+        where = []
+        params: list = []
+        if client:
+            key = _key(client)
+            where.append("client_key >= ? AND client_key < ?")
+            params += [key, key + "\uffff"]
+        if address:
+            key = _key(address)
+            where.append("address_key >= ? AND address_key < ?")
+            params += [key, key + "\uffff"]
+        if date_from:
+            where.append("created_at >= ?")
+            params.append(_day_start(date_from))
+        if date_to:
+            where.append("created_at < ?")
+            params.append((datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)).timestamp())
+        if min_total is not None:
+            where.append("total >= ?")
+            params.append(min_total)
+        if max_total is not None:
+            where.append("total <= ?")
+            params.append(max_total)
+        if cursor:
+            created_at, _, quote_number = cursor.partition(":")
+            where.append("(created_at < ? OR (created_at = ? AND quote_number < ?))")
+            params += [float(created_at), float(created_at), quote_number]
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        sql = f"SELECT {', '.join(_SUMMARY_COLUMNS)} FROM quotes"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, quote_number DESC LIMIT ?"
+        rows = self._connect().execute(sql, (*params, limit + 1)).fetchall()
+
+        results = [dict(zip(_SUMMARY_COLUMNS, row)) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = results[-1]
+            next_cursor = f"{last['created_at']!r}:{last['quote_number']}"
+        return {"results": results, "next_cursor": next_cursor}
+
+
+_store: QuoteStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_quote_store() -> QuoteStore:
+    """The process-wide quote store, opened on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = QuoteStore(os.environ.get(
+                    "WD_QUOTE_DB",
+                    os.path.join(tempfile.gettempdir(), "wd-quotes.sqlite3"),
+                ))
+    return _store
@@ -0,0 +1,108 @@
+"""
+What-if pricing of one schedule across glass and finish options.
+
+Clients are routinely shown the same schedule with several glass types and
+finishes. Instead of one full quote per combination, the schedule is
+compiled into columns once and every scenario reprices those columns:
+
+    unit_price = base_price * glass_multiplier + finish_surcharge + addon_total
+
+Only distinct lines (base price, add-ons, quantity) are priced, and only
+once per distinct multiplier and surcharge: clear and laminated glass, or
+the standard Colorbond finishes, share one pass. A sweep therefore costs a
+few column passes with no catalogue lookups. Every scenario total is identical
+to the quote the schedule would get with that glass and finish on every
+line. No quote numbers are allocated and nothing is stored.
+"""
+
+from __future__ import annotations
+
+from operator import mul
+
+from app.batch import GST_RATE, BatchQuote, compile_schedule
+from app.catalogue import Catalogue, get_catalogue
+from app.metrics import count_lines, timed
+
+
+def _options(index: dict[str, int], ids: list[str] | None, kind: str) -> list[int]:
+    if ids is None:
+        return list(range(len(index)))
+    positions = []
+    for option_id in dict.fromkeys(ids):
+        position = index.get(option_id)
+        if position is None:
+            raise ValueError(f"Unknown {kind} option: {option_id}")
+        positions.append(position)
+    if not positions:
+        raise ValueError(f"At least one {kind} option is required")
+    return positions
+
+
+def _totals(line_totals: list[float]) -> dict:
+    subtotal = round(sum(line_totals), 2)
+    gst = round(subtotal * GST_RATE, 2)
+    return {"subtotal": subtotal, "gst": gst, "total": round(subtotal + gst, 2)}
+
+
+def sweep_scenarios(
+    items: list[dict],
+    glass_ids: list[str] | None = None,
+    finish_ids: list[str] | None = None,
+    catalogue: Catalogue | None = None,
+) -> dict:
+    """
+    Price ``items`` with every ``glass_ids`` x ``finish_ids`` override.
+
+    ``None`` means every option in the catalogue. Returns the schedule's own
+    totals as ``baseline`` and one row per combination (glass-major) with
+    its totals and difference from the baseline. Raises ``ValueError`` for
+    an invalid item or unknown option.
+    """
+    catalogue = catalogue or get_catalogue()
+    glasses = _options(catalogue.glass_index, glass_ids, "glass")
+    finishes = _options(catalogue.finish_index, finish_ids, "finish")
+
+    with timed("lookup"):
+        columns = compile_schedule(items, catalogue)
+    with timed("price"):
+        baseline = BatchQuote(columns)
+        # Lines with the same base price, add-ons and quantity always total the
+        # same, so each distinct one is priced once per scenario.
+        distinct: dict[tuple, int] = {}
+        positions = [
+            distinct.setdefault(line, len(distinct))
+            for line in zip(baseline.base_price, columns.addon_total, columns.quantity)
+        ]
+        base_price, addon_total, quantity = zip(*distinct) if distinct else ((), (), ())
+        # Options with the same multiplier or surcharge price identically.
+        priced: dict[tuple[float, float], dict] = {}
+        scenarios = []
+        for g in glasses:
+            glass = catalogue.glass_options[g]
+            multiplier = glass["multiplier"]
+            glazed = None
+            for f in finishes:
+                finish = catalogue.finish_options[f]
+                surcharge = finish["surcharge"]
+                totals = priced.get((multiplier, surcharge))
+                if totals is None:
+                    if glazed is None:
+                        glazed = [b * multiplier for b in base_price]
+                    line_totals = [
+                        round(t, 2)
+                        for t in map(mul, [p + surcharge + a for p, a in zip(glazed, addon_total)], quantity)
+                    ]
+                    totals = priced[multiplier, surcharge] = _totals([line_totals[i] for i in positions])
+                row = {"glass_id": glass["id"], "finish_id": finish["id"], **totals}
+                row["difference"] = round(row["total"] - baseline.total, 2)
+                scenarios.append(row)
+    count_lines(len(columns) * len(scenarios))
+
+    return {
+        "catalogue_version": catalogue.version,
+        "lines": len(columns),
+        "baseline": {"subtotal": baseline.subtotal, "gst": baseline.gst, "total": baseline.total},
+        "glass_options": {catalogue.glass_options[g]["id"]: catalogue.glass_options[g]["name"] for g in glasses},
+        "finish_options": {catalogue.finish_options[f]["id"]: catalogue.finish_options[f]["name"] for f in finishes},
+        "scenarios": scenarios,
+    }
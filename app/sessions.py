@@ -0,0 +1,247 @@
+"""
+Server-side quote sessions for the interactive quote builder.
+
+A session keeps the item specs, priced lines and running totals of a quote
+while it is being edited. Patches add, remove or edit individual lines;
+only the touched lines are repriced and the subtotal is adjusted by the
+difference, so an edit costs the same on a 5-line quote as on a 5,000-line
+one. The quote number is minted once when the session is created; the
+first save stores the quote under it and later saves update that copy.
+
+Running totals are kept in integer cents so repeated add/subtract never
+drifts from the sum of the rounded line totals.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.batch import GST_RATE, price_schedule
+from app.catalogue import Catalogue, get_catalogue
+from app.quote_numbers import next_quote_number
+from app.quote_store import DuplicateQuoteNumber
+
+SESSION_TTL = 4 * 3600
+
+
+def _cents(amount: float) -> int:
+    return round(amount * 100)
+
+
+class QuoteSession:
+    """An editable, incrementally priced quote."""
+
+    def __init__(
+        self,
+        quote_number: str,
+        client_name: str,
+        project_address: str,
+        items: list[dict],
+        catalogue: Catalogue | None = None,
+    ) -> None:
+        self.session_id = uuid.uuid4().hex
+        self.quote_number = quote_number
+        self.client_name = client_name
+        self.project_address = project_address
+        # Edits keep pricing against the catalogue the session started on.
+        self.catalogue = catalogue or get_catalogue()
+        self.revision = 0
+        self.saved = False
+        self.touched_at = time.time()
+        self.lock = threading.Lock()
+
+        batch = price_schedule(items, self.catalogue)
+        self.items = [dict(item) for item in items]
+        self.lines = [batch.line_dict(i) for i in range(len(batch))]
+        self.line_cents = [_cents(total) for total in batch.line_total]
+        self.subtotal_cents = sum(self.line_cents)
+
+    def _price(self, item: dict) -> tuple[dict, int]:
+        line = price_schedule([item], self.catalogue).line_dict(0)
+        return line, _cents(line["line_total"])
+
+    def totals(self) -> dict:
+        subtotal = self.subtotal_cents / 100
+        gst = round(subtotal * GST_RATE, 2)
+        return {
+            "line_count": len(self.lines),
+            "subtotal": subtotal,
+            "gst": gst,
+            "total": round(subtotal + gst, 2),
+        }
+
+    def to_dict(self) -> dict:
+        """The full quote in ``QuoteResult`` shape, plus session fields."""
+        totals = self.totals()
+        return {
+            "session_id": self.session_id,
+            "revision": self.revision,
+            "quote_number": self.quote_number,
+            "client_name": self.client_name,
+            "project_address": self.project_address,
+            "line_items": self.lines,
+            "subtotal": totals["subtotal"],
+            "gst": totals["gst"],
+            "total": totals["total"],
+            "catalogue_version": self.catalogue.version,
+        }
+
+    def save(self, store) -> dict:
+        """
+        Persist the current quote to a ``QuoteStore`` under its quote number.
+
+        The first save stores a new quote; if another quote already holds the
+        number the session takes a fresh one. Later saves update the session's
+        own stored copy.
+        """
+        with self.lock:
+            while True:
+                quote = self.to_dict()
+                del quote["session_id"], quote["revision"]
+                fields = dict(
+                    subtotal=quote["subtotal"],
+                    gst=quote["gst"],
+                    total=quote["total"],
+                    line_count=len(quote["line_items"]),
+                    document=json.dumps(quote, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+                )
+                if self.saved and store.update(self.quote_number, self.client_name, self.project_address, **fields):
+                    return quote
+                try:
+                    store.save(self.quote_number, self.client_name, self.project_address, **fields)
+                except DuplicateQuoteNumber:
+                    self.quote_number = next_quote_number()
+                    continue
+                self.saved = True
+                return quote
+
+    def apply(self, ops: list[dict]) -> dict:
+        """
+        Apply a list of patch operations atomically.
+
+        Supported operations::
+
+            {"op": "add", "item": {...}, "index": N}        # index optional, default end
+            {"op": "remove", "index": N}
+            {"op": "edit", "index": N, "item": {...}}       # replace the item spec
+            {"op": "edit", "index": N, "changes": {...}}    # merge into the item spec
+
+        Raises ``ValueError`` (leaving the session unchanged) if any
+        operation is invalid. Returns the changed lines and new totals.
+        """
+        with self.lock:
+            undo = []
+            results = []
+            try:
+                for op in ops:
+                    results.append(self._apply_one(op, undo))
+            except (KeyError, TypeError, ValueError) as exc:
+                for restore in reversed(undo):
+                    restore()
+                if isinstance(exc, KeyError):
+                    raise ValueError(f"Missing field {exc}") from exc
+                raise ValueError(str(exc)) from exc
+            self.revision += 1
+            self.touched_at = time.time()
+            return {
+                "session_id": self.session_id,
+                "revision": self.revision,
+                "changes": results,
+                **self.totals(),
+            }
+
+    def _index(self, op: dict, allow_end: bool = False) -> int:
+        index = op["index"]
+        upper = len(self.lines) if allow_end else len(self.lines) - 1
+        if not isinstance(index, int) or index < 0 or index > upper:
+            raise ValueError(f"Line index {index!r} out of range")
+        return index
+
+    def _apply_one(self, op: dict, undo: list) -> dict:
+        kind = op.get("op")
+        if kind == "add":
+            index = self._index(op, allow_end=True) if "index" in op else len(self.lines)
+            item = dict(op["item"])
+            line, cents = self._price(item)
+            self._insert(index, item, line, cents)
+            undo.append(lambda: self._delete(index))
+            return {"op": "add", "index": index, "line": line}
+
+        if kind == "remove":
+            index = self._index(op)
+            removed = (self.items[index], self.lines[index], self.line_cents[index])
+            self._delete(index)
+            undo.append(lambda: self._insert(index, *removed))
+            return {"op": "remove", "index": index}
+
+        if kind == "edit":
+            index = self._index(op)
+            if "item" in op:
+                item = dict(op["item"])
+            else:
+                item = dict(self.items[index], **op["changes"])
+            line, cents = self._price(item)
+            previous = (self.items[index], self.lines[index], self.line_cents[index])
+            self._replace(index, item, line, cents)
+            undo.append(lambda: self._replace(index, *previous))
+            return {"op": "edit", "index": index, "line": line}
+
+        raise ValueError(f"Unknown patch op {kind!r}")
+
+    def _insert(self, index: int, item: dict, line: dict, cents: int) -> None:
+        self.items.insert(index, item)
+        self.lines.insert(index, line)
+        self.line_cents.insert(index, cents)
+        self.subtotal_cents += cents
+
+    def _delete(self, index: int) -> None:
+        del self.items[index]
+        del self.lines[index]
+        self.subtotal_cents -= self.line_cents.pop(index)
+
+    def _replace(self, index: int, item: dict, line: dict, cents: int) -> None:
+        self.subtotal_cents += cents - self.line_cents[index]
+        self.items[index] = item
+        self.lines[index] = line
+        self.line_cents[index] = cents
+
+
+class SessionStore:
+    """In-memory sessions, expired after ``ttl`` idle seconds or beyond ``max_sessions``."""
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = SESSION_TTL) -> None:
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: OrderedDict[str, QuoteSession] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, session: QuoteSession) -> None:
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._expire()
+
+    def get(self, session_id: str) -> QuoteSession | None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if session.touched_at + self.ttl < time.time():
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and oldest.touched_at >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+
+
+SESSIONS = SessionStore()
@@ -0,0 +1,212 @@
+"""
+Opening dimensions to catalogue sizes.
+
+A takeoff reads openings such as "Awning 1200x900" off a schedule; pricing
+needs a ``product_id`` and ``size_index``. ``SizeIndex`` keeps a small 2-d
+tree over the ``width``/``height`` of every catalogue size, one per product
+plus one across all products. A query then visits only the branches that
+can still beat the best match so far:
+
+- ``nearest``: the size closest to the opening (Euclidean, in mm);
+- ``next_larger``: the closest size at least as wide and as tall as the
+  opening, i.e. the smallest standard size it can be made from.
+
+Each match carries its ``distance`` in mm and a ``score`` from 0 to 1
+(1 for an exact size). The index is rebuilt when the catalogue version
+changes.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+
+from app.catalogue import Catalogue, get_catalogue
+
+NEAREST = "nearest"
+NEXT_LARGER = "next_larger"
+MODES = (NEAREST, NEXT_LARGER)
+
+_DIMENSIONS = re.compile(r"(\d{2,5})\s*(?:mm)?\s*[x×X*]\s*(\d{2,5})")
+
+
+def parse_dimensions(text: str) -> tuple[int, int] | None:
+    """``(width, height)`` in mm from text like ``"Awning 1200 x 900mm"``."""
+    found = _DIMENSIONS.search(text)
+    if found is None:
+        return None
+    return int(found.group(1)), int(found.group(2))
+
+
+class _Node:
+    __slots__ = ("width", "height", "entry", "axis", "left", "right", "max_width", "max_height")
+
+    def __init__(self, width, height, entry, axis, left, right, max_width, max_height) -> None:
+        self.width = width
+        self.height = height
+        self.entry = entry
+        self.axis = axis
+        self.left = left
+        self.right = right
+        # Largest width and height anywhere in this subtree.
+        self.max_width = max_width
+        self.max_height = max_height
+
+
+def _build(points: list[tuple[int, int, tuple]], depth: int = 0) -> _Node | None:
+    if not points:
+        return None
+    axis = depth % 2
+    points.sort(key=lambda p: (p[axis], p[1 - axis], p[2]))
+    middle = len(points) // 2
+    width, height, entry = points[middle]
+    left = _build(points[:middle], depth + 1)
+    right = _build(points[middle + 1:], depth + 1)
+    return _Node(
+        width,
+        height,
+        entry,
+        axis,
+        left,
+        right,
+        max([width, *(n.max_width for n in (left, right) if n)]),
+        max([height, *(n.max_height for n in (left, right) if n)]),
+    )
+
+
+class SizeMatch:
+    """The catalogue size chosen for one opening."""
+
+    __slots__ = ("product_id", "size_index", "size", "distance", "score")
+
+    def __init__(self, product_id: str, size_index: int, size: dict, distance: float, score: float) -> None:
+        self.product_id = product_id
+        self.size_index = size_index
+        self.size = size
+        self.distance = distance
+        self.score = score
+
+    def to_dict(self) -> dict:
+        return {
+            "product_id": self.product_id,
+            "size_index": self.size_index,
+            "size_label": self.size["label"],
+            "width": self.size["width"],
+            "height": self.size["height"],
+            "distance": round(self.distance, 1),
+            "score": round(self.score, 3),
+        }
+
+
+class SizeIndex:
+    """2-d trees over catalogue sizes, per product and across all products."""
+
+    def __init__(self, catalogue: Catalogue) -> None:
+        self.catalogue = catalogue
+        self.version = catalogue.version
+        self._trees: dict[str | None, _Node | None] = {}
+        everything = []
+        for product in catalogue.products:
+            if product["id"] in self._trees:
+                continue
+            points = [
+                (size["width"], size["height"], (product["id"], index, size))
+                for index, size in enumerate(product["sizes"])
+            ]
+            everything += points
+            self._trees[product["id"]] = _build(list(points))
+        self._trees[None] = _build(everything)
+
+    def match(self, width: float, height: float, product_id: str | None = None, mode: str = NEAREST) -> SizeMatch | None:
+        """
+        Best catalogue size for a ``width`` x ``height`` opening.
+
+        ``product_id=None`` searches every product. Returns ``None`` if the
+        product has no sizes or, for ``next_larger``, none is big enough.
+        Raises ``ValueError`` for an unknown product or mode.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown match mode {mode!r}; expected one of {', '.join(MODES)}")
+        if product_id not in self._trees:
+            raise ValueError(f"Unknown product: {product_id}")
+        best = [math.inf, None]
+        _search(self._trees[product_id], width, height, mode == NEXT_LARGER, best)
+        distance, entry = best
+        if entry is None:
+            return None
+        found_id, size_index, size = entry
+        score = max(0.0, 1.0 - distance / math.hypot(width, height)) if width or height else 0.0
+        return SizeMatch(found_id, size_index, size, distance, score)
+
+    def match_many(self, openings: list[dict], mode: str = NEAREST) -> list[dict]:
+        """
+        Match a whole schedule in one call.
+
+        Each opening gives ``width`` and ``height`` (or a ``size`` string such
+        as ``"1200x900"``) and optionally ``product_id`` and ``mode``. Returns
+        one dict per opening, in order: the match, or ``{"error": ...}``.
+        """
+        results = []
+        for opening in openings:
+            try:
+                if "width" in opening and "height" in opening:
+                    width, height = float(opening["width"]), float(opening["height"])
+                else:
+                    dimensions = parse_dimensions(str(opening.get("size", "")))
+                    if dimensions is None:
+                        raise ValueError("Opening needs width and height or a size like '1200x900'")
+                    width, height = dimensions
+                found = self.match(width, height, opening.get("product_id"), opening.get("mode", mode))
+            except (TypeError, ValueError) as exc:
+                results.append({"error": str(exc)})
+                continue
+            if found is None:
+                results.append({"error": f"No catalogue size fits {width:g} x {height:g}mm"})
+            else:
+                results.append(found.to_dict())
+        return results
+
+
+def _search(node: _Node | None, width: float, height: float, must_fit: bool, best: list) -> None:
+    if node is None:
+        return
+    if must_fit and (node.max_width < width or node.max_height < height):
+        return
+    if not must_fit or (node.width >= width and node.height >= height):
+        distance = math.hypot(node.width - width, node.height - height)
+        if distance < best[0] or (distance == best[0] and node.entry[:2] < best[1][:2]):
+            best[0] = distance
+            best[1] = node.entry
+    delta = (width if node.axis == 0 else height) - (node.width if node.axis == 0 else node.height)
+    near, far = (node.left, node.right) if delta < 0 else (node.right, node.left)
+    _search(near, width, height, must_fit, best)
+    # The far side can only hold a closer size if the splitting line is nearer than the best.
+    if abs(delta) <= best[0]:
+        _search(far, width, height, must_fit, best)
+
+
+_index: SizeIndex | None = None
+
+
+def get_size_index() -> SizeIndex:
+    """Size index for the current catalogue, rebuilt when its version changes."""
+    global _index
+    catalogue = get_catalogue()
+    index = _index
+    if index is None or index.version != catalogue.version:
+        index = SizeIndex(catalogue)
+        _index = index
+    return index
+
+
+def size_index_for(catalogue: Catalogue) -> SizeIndex:
+    """Size index for ``catalogue``: the shared one if it is current, else a new one."""
+    index = _index
+    if index is not None and index.version == catalogue.version:
+        return index
+    return SizeIndex(catalogue)
+
+
+def match_sizes(openings: list[dict], mode: str = NEAREST) -> list[dict]:
+    """Batch-match openings against the current catalogue (see ``SizeIndex.match_many``)."""
+    return get_size_index().match_many(openings, mode)
@@ -0,0 +1,114 @@
+"""
+Startup mode and build-time precompilation.
+
+On serverless hosts every cold start pays for whatever ``app.main`` does at
+import, so in lazy mode (``WD_STARTUP=lazy``, the default for the Vercel
+entry point) the template environment, the compiled catalogue and the
+static file app are only built when a request first needs them. Eager mode
+(the default otherwise) builds them all at import so a long-running server
+never pays for them on a request.
+
+``python -m app.startup`` runs ahead of a deploy and writes what a cold
+start would otherwise have to compute:
+
+- ``app/catalogue_snapshot.json``, the catalogue loaded instead of
+  compiling ``app/products.py`` (ignored once that file changes);
+- ``app/_build/jinja/``, compiled template bytecode. It is specific to the
+  Python version that wrote it, so it is not committed, and the Vercel
+  build has no step to write it. Only hosts that run this command on the
+  Python that serves the app get it. A missing, mismatched or stale entry
+  is simply recompiled.
+"""
+
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent
+TEMPLATE_DIR = APP_DIR / "templates"
+STATIC_DIR = APP_DIR / "static"
+BYTECODE_DIR = APP_DIR / "_build" / "jinja"
+
+
+def lazy_startup() -> bool:
+    """True when ``WD_STARTUP=lazy``."""
+    return os.environ.get("WD_STARTUP", "eager") == "lazy"
+
+
+def _bytecode_cache():
+    from jinja2 import FileSystemBytecodeCache
+
+    class BuildBytecodeCache(FileSystemBytecodeCache):
+        """
+        Bytecode keyed by template name only, so a cache built in one checkout
+        is found from another path; Jinja still checks the source checksum.
+        Writes are best effort, since the deployed tree is read-only.
+        """
+
+        def get_cache_key(self, name, filename=None):
+            return super().get_cache_key(name)
+
+        def dump_bytecode(self, bucket):
+            try:
+                super().dump_bytecode(bucket)
+            except OSError:
+                pass
+
+    return BuildBytecodeCache(str(BYTECODE_DIR), "%s.cache")
+
+
+@lru_cache(maxsize=1)
+def get_templates():
+    """The app's ``Jinja2Templates``, created on first use."""
+    from fastapi.templating import Jinja2Templates
+    from jinja2 import Environment, FileSystemLoader
+
+    env = Environment(
+        loader=FileSystemLoader(str(TEMPLATE_DIR)),
+        autoescape=True,
+        bytecode_cache=_bytecode_cache(),
+    )
+    return Jinja2Templates(env=env)
+
+
+class LazyStaticFiles:
+    """ASGI app that creates ``StaticFiles`` on the first static request."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self._app = None
+
+    async def __call__(self, scope, receive, send) -> None:
+        if self._app is None:
+            from fastapi.staticfiles import StaticFiles
+
+            self._app = StaticFiles(directory=str(self.directory))
+        await self._app(scope, receive, send)
+
+
+def precompile() -> dict:
+    """Write the catalogue snapshot and compile every template to bytecode."""
+    from app.catalogue import SNAPSHOT_PATH, compile_catalogue, write_snapshot
+
+    catalogue = compile_catalogue()
+    write_snapshot(catalogue)
+
+    BYTECODE_DIR.mkdir(parents=True, exist_ok=True)
+    env = get_templates().env
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return {
+        "catalogue_version": catalogue.version,
+        "snapshot": str(SNAPSHOT_PATH.relative_to(APP_DIR.parent)),
+        "templates": names,
+        "bytecode_dir": str(BYTECODE_DIR.relative_to(APP_DIR.parent)),
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(precompile(), indent=2))
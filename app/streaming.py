@@ -0,0 +1,358 @@
+"""
+Streaming quote generation for very large takeoffs.
+
+Line items arrive as NDJSON (one item object per line) or as a JSON array
+that may be split across any number of chunks. Items are priced as soon as
+each chunk is parsed and written straight back out as NDJSON records:
+
+    {"type": "header", "quote_number": ..., "client_name": ..., "project_address": ..., "catalogue_version": ...}
+    {"type": "line", "line": 1, ...QuoteLineItem fields..., "running_subtotal": ...}
+    ...
+    {"type": "totals", "line_count": ..., "subtotal": ..., "gst": ..., "total": ...}
+
+If an item cannot be parsed or priced the stream ends with an
+``{"type": "error", ...}`` record instead of totals. Items over
+``MAX_ITEM_BYTES`` are refused without buffering the rest of them. Nothing but the
+running sum is kept between chunks, so memory stays flat regardless of
+schedule size.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from collections.abc import AsyncIterable, AsyncIterator
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.batch import GST_RATE, BatchQuote, ScheduleColumns
+from app.catalogue import get_catalogue
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Cap on one line item as sent; an item runs to a few hundred bytes.
+MAX_ITEM_BYTES = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+# What can end an object: braces and quotes outside strings, quotes and
+# escapes inside them.
+_OBJECT_SPECIAL = re.compile(r'[{}"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Streaming response that leaves ``receive`` to the request body.
+
+    Starlette's ``StreamingResponse`` polls ``receive`` for a disconnect
+    while streaming, which steals body chunks from ``request.stream()``
+    when the response starts before the upload has finished. A client
+    disconnect still surfaces through ``request.stream()``.
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _record(obj: dict) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class ItemTooLarge(ValueError):
+    """A single line item in the request body is over ``MAX_ITEM_BYTES``."""
+
+
+def _check_size(size: int) -> None:
+    if size > MAX_ITEM_BYTES:
+        raise ItemTooLarge(f"Line item exceeds {MAX_ITEM_BYTES} bytes")
+
+
+class NDJSONItemParser:
+    """Incremental parser for newline-delimited item objects."""
+
+    def __init__(self) -> None:
+        self._pending = bytearray()
+
+    def feed(self, chunk: bytes) -> list[dict]:
+        self._pending += chunk
+        if b"\n" not in chunk:
+            _check_size(len(self._pending))
+            return []
+        *lines, tail = self._pending.split(b"\n")
+        self._pending = tail
+        items = []
+        for line in lines:
+            _check_size(len(line))
+            if line.strip():
+                items.append(json.loads(line))
+        _check_size(len(tail))
+        return items
+
+    def close(self) -> list[dict]:
+        tail, self._pending = self._pending, bytearray()
+        return [json.loads(tail)] if tail.strip() else []
+
+
+class JSONArrayItemParser:
+    """
+    Incremental parser for a JSON array of item objects.
+
+    An object split across chunks is held as its pieces while braces and
+    strings are scanned for its end, resuming where the last chunk left
+    off, and decoded once when complete.
+    """
+
+    def __init__(self) -> None:
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._started = False
+        self._finished = False
+        self._need_separator = False
+        self._after_comma = False
+        # The object in progress: its pieces so far and the scan state.
+        self._parts: list[str] = []
+        self._held = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: bytes) -> list[dict]:
+        return self._parse(self._text.decode(chunk))
+
+    def close(self) -> list[dict]:
+        items = self._parse(self._text.decode(b"", final=True))
+        if not self._finished or self._depth:
+            raise ValueError("Incomplete JSON array of line items")
+        return items
+
+    def _scan(self, text: str, pos: int) -> int:
+        """Scan on from ``pos``; the index just past the object's closing brace, or -1."""
+        end = len(text)
+        while pos < end:
+            if self._escape:
+                self._escape = False
+                pos += 1
+            elif self._in_string:
+                match = _STRING_SPECIAL.search(text, pos)
+                if match is None:
+                    return -1
+                pos = match.end()
+                if match.group() == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+            else:
+                match = _OBJECT_SPECIAL.search(text, pos)
+                if match is None:
+                    return -1
+                pos = match.end()
+                char = match.group()
+                if char == '"':
+                    self._in_string = True
+                elif char == "{":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        return pos
+        return -1
+
+    def _hold(self, text: str) -> None:
+        self._held += len(text)
+        _check_size(self._held)
+        self._parts.append(text)
+
+    def _decode(self, text: str) -> dict:
+        self._parts = []
+        self._held = 0
+        _check_size(len(text))
+        item, end = _decoder.raw_decode(text)
+        if end != len(text):
+            raise ValueError("Line items must be JSON objects")
+        self._need_separator = True
+        self._after_comma = False
+        return item
+
+    def _parse(self, text: str) -> list[dict]:
+        items: list[dict] = []
+        pos = 0
+        end = len(text)
+        if self._depth:
+            # Rest of an object split across chunks.
+            done = self._scan(text, 0)
+            if done < 0:
+                self._hold(text)
+                return items
+            self._parts.append(text[:done])
+            items.append(self._decode("".join(self._parts)))
+            pos = done
+        while True:
+            while pos < end and text[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= end:
+                break
+            char = text[pos]
+            if self._finished:
+                raise ValueError("Unexpected data after end of JSON array")
+            if not self._started:
+                if char != "[":
+                    raise ValueError("Expected a JSON array of line items")
+                self._started = True
+                pos += 1
+            elif char == "]" and not self._after_comma:
+                self._finished = True
+                pos += 1
+            elif self._need_separator:
+                if char != ",":
+                    raise ValueError("Expected ',' between line items")
+                self._need_separator = False
+                self._after_comma = True
+                pos += 1
+            else:
+                if char != "{":
+                    raise ValueError("Line items must be JSON objects")
+                done = self._scan(text, pos)
+                if done < 0:
+                    # Object is split across chunks; wait for the rest.
+                    self._hold(text[pos:])
+                    break
+                items.append(self._decode(text[pos:done]))
+                pos = done
+        return items
+
+
+def _as_item(obj) -> dict:
+    if not isinstance(obj, dict):
+        raise ValueError("Line items must be JSON objects")
+    return obj
+
+
+def parser_for(content_type: str | None) -> NDJSONItemParser | JSONArrayItemParser:
+    """Pick the item parser for a request ``Content-Type``."""
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if media_type in ("application/json", "text/json"):
+        return JSONArrayItemParser()
+    return NDJSONItemParser()
+
+
+class _RunningQuote:
+    """Line counter and running sum carried between chunks."""
+
+    __slots__ = ("catalogue", "line_count", "running")
+
+    def __init__(self, catalogue) -> None:
+        self.catalogue = catalogue
+        self.line_count = 0
+        self.running = 0
+
+    def price(self, items: list[dict]) -> tuple[bytes, str | None]:
+        """Price a chunk of items; stops at the first invalid item."""
+        columns = ScheduleColumns(self.catalogue)
+        error = None
+        for item in items:
+            try:
+                columns.append(_as_item(item))
+            except KeyError as exc:
+                error = f"Missing field {exc}"
+                break
+            except (TypeError, ValueError) as exc:
+                error = str(exc)
+                break
+
+        batch = BatchQuote(columns)
+        records = []
+        for i, line_total in enumerate(batch.line_total):
+            # Accumulated left to right, exactly as sum() does in generate_quote.
+            self.running += line_total
+            self.line_count += 1
+            record = {"type": "line", "line": self.line_count}
+            record.update(batch.line_dict(i))
+            record["running_subtotal"] = round(self.running, 2)
+            records.append(_record(record))
+        if error is not None:
+            records.append(_record({"type": "error", "line": self.line_count + 1, "detail": error}))
+        return b"".join(records), error
+
+
+async def _item_batches(
+    chunks: AsyncIterable[bytes],
+    parser: NDJSONItemParser | JSONArrayItemParser,
+) -> AsyncIterator[list[dict]]:
+    async for chunk in chunks:
+        items = parser.feed(chunk)
+        if items:
+            yield items
+    items = parser.close()
+    if items:
+        yield items
+
+
+async def stream_quote(
+    chunks: AsyncIterable[bytes],
+    parser: NDJSONItemParser | JSONArrayItemParser,
+    quote_number: str,
+    client_name: str,
+    project_address: str,
+) -> AsyncIterator[bytes]:
+    """
+    Price items as they arrive and yield NDJSON records.
+
+    The body is read up to the first items before the header is yielded,
+    so a body that is malformed or has an oversize item from the start
+    raises ``ValueError`` (``ItemTooLarge``) here rather than in the stream.
+    """
+    # The whole stream prices against the catalogue current when it started.
+    quote = _RunningQuote(get_catalogue())
+    batches = _item_batches(chunks, parser)
+    items = await anext(batches, None)
+    yield _record({
+        "type": "header",
+        "quote_number": quote_number,
+        "client_name": client_name,
+        "project_address": project_address,
+        "catalogue_version": quote.catalogue.version,
+    })
+
+    try:
+        while items is not None:
+            out, error = quote.price(items)
+            yield out
+            if error is not None:
+                return
+            items = await anext(batches, None)
+    except ValueError as exc:
+        # Malformed JSON or an oversize item in the request body.
+        yield _record({"type": "error", "line": quote.line_count + 1, "detail": str(exc)})
+        return
+
+    subtotal = round(quote.running, 2)
+    gst = round(subtotal * GST_RATE, 2)
+    yield _record({
+        "type": "totals",
+        "line_count": quote.line_count,
+        "subtotal": subtotal,
+        "gst": gst,
+        "total": round(subtotal + gst, 2),
+    })
+
+
+async def started(records: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Run ``records`` to its first record, then return an iterator over all
+    of them. Errors raised before the first record reach the caller while
+    an HTTP status can still be chosen.
+    """
+    first = await anext(records)
+
+    async def resumed() -> AsyncIterator[bytes]:
+        yield first
+        async for record in records:
+            yield record
+
+    return resumed()
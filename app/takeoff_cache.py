@@ -0,0 +1,249 @@
+"""
+Content-addressed cache of takeoff extraction results.
+
+Estimators often upload the same schedule several times while trying
+different glass and finish choices. Extraction results are keyed on the
+SHA-256 of the document, kept in a bounded in-memory LRU and mirrored to
+an on-disk tier, both with a TTL. Re-pricing a cached takeoff skips
+extraction and goes straight to ``generate_quote``.
+
+The disk tier lives in ``WD_TAKEOFF_CACHE_DIR`` (default: a directory
+under the system temp dir) and is trimmed oldest-first once it exceeds
+its byte budget. If the directory cannot be created, only the memory
+tier is used.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from app.estimator import simulate_ai_takeoff
+from app.metrics import REGISTRY, timed
+from app.models import DIGEST_PATTERN
+
+DEFAULT_TTL = 7 * 24 * 3600
+
+_DIGEST = re.compile(DIGEST_PATTERN)
+
+
+def takeoff_digest(filename: str, content: bytes | None = None) -> str:
+    """
+    Cache key for a schedule document.
+
+    Uses the document bytes when available. The simulated takeoff only
+    receives a filename, so that is hashed instead.
+    """
+    if content is None:
+        content = filename.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+class TakeoffCache:
+    """Two-tier (memory + disk) TTL cache of takeoff results keyed by digest."""
+
+    def __init__(
+        self,
+        directory: str | Path | None = None,
+        max_entries: int = 256,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+        ttl: float = DEFAULT_TTL,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self.directory: Path | None = None
+        if directory is not None:
+            try:
+                self.directory = Path(directory)
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._disk_bytes = sum(p.stat().st_size for p in self.directory.glob("*.json"))
+            except OSError:
+                self.directory = None
+
+    def get(self, digest: str) -> dict | None:
+        """The cached result for ``digest``; ``None`` if absent, expired or not a digest."""
+        if not _DIGEST.match(digest):
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._memory.move_to_end(digest)
+                    self.hits += 1
+                    return result
+                del self._memory[digest]
+
+        result = self._read_disk(digest, now)
+        if result is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        self._remember(digest, result, now + self.ttl)
+        return result
+
+    def put(self, digest: str, result: dict) -> None:
+        self._remember(digest, result, time.time() + self.ttl)
+        self._write_disk(digest, result)
+
+    def stats(self) -> dict:
+        return {
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+    def _remember(self, digest: str, result: dict, expires_at: float) -> None:
+        with self._lock:
+            self._memory[digest] = (expires_at, result)
+            self._memory.move_to_end(digest)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, digest: str) -> Path:
+        # Digests name files in the cache directory; never let one leave it.
+        if not _DIGEST.match(digest):
+            raise ValueError(f"Not a takeoff digest: {digest!r}")
+        return self.directory / f"{digest}.json"
+
+    def _read_disk(self, digest: str, now: float) -> dict | None:
+        if self.directory is None:
+            return None
+        path = self._path(digest)
+        try:
+            if path.stat().st_mtime + self.ttl <= now:
+                self._remove(path)
+                return None
+            result = json.loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(result, dict) or not isinstance(result.get("extracted_items"), list):
+            return None
+        return result
+
+    def _write_disk(self, digest: str, result: dict) -> None:
+        if self.directory is None:
+            return
+        data = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        path = self._path(digest)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # An overwritten entry no longer counts towards the budget.
+            try:
+                replaced = path.stat().st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes += len(data) - replaced
+        if self._disk_bytes > self.max_disk_bytes:
+            self._trim_disk()
+
+    def _trim_disk(self) -> None:
+        """Drop expired files, then the oldest, until under the byte budget."""
+        now = time.time()
+        files = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if total <= self.max_disk_bytes and mtime + self.ttl > now:
+                break
+            self._remove(path)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def _remove(self, path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+_cache: TakeoffCache | None = None
+
+
+def get_takeoff_cache() -> TakeoffCache:
+    """The process-wide takeoff cache, created on first use."""
+    global _cache
+    if _cache is None:
+        directory = os.environ.get(
+            "WD_TAKEOFF_CACHE_DIR",
+            os.path.join(tempfile.gettempdir(), "wd-takeoff-cache"),
+        )
+        _cache = TakeoffCache(directory)
+    return _cache
+
+
+def _collect() -> list[tuple]:
+    if _cache is None:
+        return []
+    stats = _cache.stats()
+    return [
+        ("wd_takeoff_cache_hits_total", "counter", "Takeoffs served from the memory tier.", stats["hits"]),
+        ("wd_takeoff_cache_disk_hits_total", "counter", "Takeoffs served from the disk tier.", stats["disk_hits"]),
+        ("wd_takeoff_cache_misses_total", "counter", "Takeoffs that ran extraction.", stats["misses"]),
+        ("wd_takeoff_cache_disk_bytes", "gauge", "Bytes held in the disk tier.", stats["disk_bytes"]),
+    ]
+
+
+REGISTRY.add_collector(_collect)
+
+
+def cached_takeoff(filename: str, digest: str | None = None, document=None) -> dict:
+    """
+    Run takeoff extraction, reusing a cached result for the same document.
+
+    ``document`` is the uploaded file's view, passed through to extraction
+    on a miss. The returned dict carries the ``digest`` to re-price against
+    later and whether it came from the cache.
+    """
+    digest = digest or takeoff_digest(filename)
+    cache = get_takeoff_cache()
+    result = cache.get(digest)
+    if result is not None:
+        return dict(result, filename=filename, digest=digest, cached=True)
+    with timed("takeoff"):
+        result = simulate_ai_takeoff(filename, document)
+    cache.put(digest, result)
+    return dict(result, digest=digest, cached=False)
+
+
+def apply_overrides(items: list[dict], glass_id: str | None = None, finish_id: str | None = None) -> list[dict]:
+    """Copy of ``items`` with glass and/or finish replaced on every line."""
+    overrides = {}
+    if glass_id is not None:
+        overrides["glass_id"] = glass_id
+    if finish_id is not None:
+        overrides["finish_id"] = finish_id
+    if not overrides:
+        return items
+    return [dict(item, **overrides) for item in items]
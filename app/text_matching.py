@@ -0,0 +1,362 @@
+"""
+Schedule text to catalogue selections.
+
+Takeoff rows arrive as free text such as ``"W03 — Sliding 2400x1200 3-panel,
+Low-E, fly screen, Monument"``. ``TextIndex`` turns each row into a
+``product_id``, ``glass_id``, ``finish_id`` and ``addon_ids`` with a
+confidence per field, and a ``size_index`` from ``app.size_matching``.
+
+Every product, glass, finish and add-on is indexed once as a weighted bag
+of tokens: name and id tokens count most, product descriptions and
+features less, and every token is weighted by its rarity across the
+catalogue. Trade shorthand is normalised before both indexing and lookup
+by ``SYNONYMS`` (``IGU`` -> double glazed, ``BAL40`` -> BAL-40 rating,
+``lift & slide`` -> sliding ...). A row is scored only against the
+postings of its own tokens, so the cost grows with the row, not the
+catalogue.
+
+Confidence blends how much of the winner's name the row covers with its
+margin over the runner-up; a tie scores at most 0.5. Schedule codes such as
+``W03`` or ``D01`` restrict the product to windows or doors.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import defaultdict
+
+from app.batch import DEFAULT_FINISH_ID, DEFAULT_GLASS_ID
+from app.catalogue import Catalogue, get_catalogue
+from app.size_matching import parse_dimensions, size_index_for
+
+# Phrase -> canonical tokens, applied longest phrase first.
+SYNONYMS = {
+    # Products
+    "lift and slide": "sliding",
+    "lift slide": "sliding",
+    "slide": "sliding",
+    "slider": "sliding",
+    "bi fold": "bifold",
+    "folding": "bifold",
+    "top hung": "awning",
+    "side hung": "casement",
+    "swing": "hinged",
+    "french": "hinged",
+    "picture": "fixed",
+    "double hinged": "hinged",
+    "fixed light": "fixed",
+    # Glass
+    "igu": "double glazed",
+    "dgu": "double glazed",
+    "dg": "double glazed",
+    "double glazing": "double glazed",
+    "low e": "lowe",
+    "low emissivity": "lowe",
+    "lam": "laminated",
+    "6 38": "laminated",
+    "6 38mm": "laminated",
+    "frosted": "obscure",
+    "privacy": "obscure",
+    "translucent": "obscure",
+    "tint": "tinted",
+    "bronze": "tinted",
+    "grey tint": "tinted",
+    "sound": "acoustic",
+    "float": "clear",
+    # Finishes
+    "matt black": "black",
+    "satin black": "black",
+    "woodland grey": "woodland",
+    "surfmist": "white",
+    "ral": "customral",
+    "custom ral": "customral",
+    "custom colour": "customral",
+    "custom color": "customral",
+    # Add-ons
+    "fly screen": "flyscreen",
+    "insect screen": "flyscreen",
+    "security screen": "securitymesh",
+    "security mesh": "securitymesh",
+    "ss mesh": "securitymesh",
+    "bal": "bal40",
+    "bal 40": "bal40",
+    "bal40": "bal40",
+    "bal rating": "bal40",
+    "bushfire": "bal40",
+    "side light": "sidelight",
+    "fixed sidelight": "sidelight",
+    "sidelite": "sidelight",
+    "highlight": "transom",
+    "premium hardware": "hardwareupgrade",
+    "hardware upgrade": "hardwareupgrade",
+}
+
+# Words that say nothing about which option is meant.
+STOPWORDS = frozenset({
+    "a", "an", "and", "the", "with", "for", "of", "to", "in", "on", "mm",
+    "x", "window", "windows", "door", "doors", "panel", "glass", "above",
+    "option", "options", "steel", "frame", "performance", "premium",
+    "upgrade", "rating", "stainless", "colour", "color",
+})
+
+# Token weights by where the token appears in a catalogue entry.
+NAME_WEIGHT = 3.0
+TEXT_WEIGHT = 1.0
+
+# Below this coverage of its name, an option is not selected.
+MIN_COVERAGE = 0.3
+# Add-ons are independent, so each must cover more than half its name.
+ADDON_COVERAGE = 0.5
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SCHEDULE_CODE = re.compile(r"^\s*([WD])\s*-?\s*\d+\b", re.IGNORECASE)
+
+
+def _build_phrases() -> dict[str, list[tuple[tuple[str, ...], tuple[str, ...]]]]:
+    phrases = defaultdict(list)
+    for phrase, canonical in SYNONYMS.items():
+        words = tuple(_TOKEN.findall(phrase))
+        phrases[words[0]].append((words, tuple(canonical.split())))
+    for options in phrases.values():
+        options.sort(key=lambda option: len(option[0]), reverse=True)
+    return dict(phrases)
+
+
+_PHRASES = _build_phrases()
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-case tokens with synonyms applied and stopwords dropped."""
+    words = _TOKEN.findall(text.lower())
+    tokens = []
+    i = 0
+    while i < len(words):
+        for phrase, canonical in _PHRASES.get(words[i], ()):
+            if tuple(words[i:i + len(phrase)]) == phrase:
+                tokens.extend(canonical)
+                i += len(phrase)
+                break
+        else:
+            tokens.append(words[i])
+            i += 1
+    # Bare numbers and thicknesses ("6mm") are left to the size matcher.
+    return [t for t in tokens if t not in STOPWORDS and not t.rstrip("m").isdigit()]
+
+
+class _Field:
+    """Inverted index over the entries of one catalogue section."""
+
+    __slots__ = ("ids", "postings", "name_weight")
+
+    def __init__(self) -> None:
+        self.ids: list[str] = []
+        self.postings: dict[str, dict[int, float]] = defaultdict(dict)
+        # Total weight of each entry's name tokens, for coverage.
+        self.name_weight: list[float] = []
+
+
+def _copy(result: dict) -> dict:
+    """A match result callers can change without touching the cached one."""
+    confidence = result["confidence"]
+    return {
+        **result,
+        "addon_ids": list(result["addon_ids"]),
+        "confidence": {**confidence, "addons": dict(confidence["addons"])},
+    }
+
+
+class TextIndex:
+    """Token inverted index over the catalogue, one per catalogue version."""
+
+    def __init__(self, catalogue: Catalogue, cache_size: int = 4096) -> None:
+        self.catalogue = catalogue
+        self.version = catalogue.version
+        self.cache_size = cache_size
+        self._cache: dict[str, dict] = {}
+        # Sizes come from the same catalogue version as the text.
+        self._sizes = size_index_for(catalogue)
+
+        entries = {
+            "product": [(p, p["id"], [p["description"], *p.get("features", ())]) for p in catalogue.products],
+            "glass": [(g, g["id"], []) for g in catalogue.glass_options],
+            "finish": [(f, f["id"], []) for f in catalogue.finish_options],
+            "addon": [(a, a["id"], []) for a in catalogue.addon_options],
+        }
+        bags = {
+            field: [self._bag(entry["name"] + " " + entry_id.replace("-", " "), text) for entry, entry_id, text in items]
+            for field, items in entries.items()
+        }
+
+        # Rarer tokens say more about which entry is meant.
+        document_count = sum(len(field_bags) for field_bags in bags.values())
+        frequency: dict[str, int] = defaultdict(int)
+        for field_bags in bags.values():
+            for names, weights in field_bags:
+                for token in weights:
+                    frequency[token] += 1
+        idf = {token: math.log(1 + document_count / count) for token, count in frequency.items()}
+
+        self._fields: dict[str, _Field] = {}
+        self._categories: dict[str, str] = {p["id"]: p["category"] for p in catalogue.products}
+        for field, items in entries.items():
+            index = _Field()
+            for position, ((entry, entry_id, _), (names, weights)) in enumerate(zip(items, bags[field])):
+                index.ids.append(entry_id)
+                index.name_weight.append(sum(NAME_WEIGHT * idf[t] for t in names))
+                for token, weight in weights.items():
+                    index.postings[token][position] = weight * idf[token]
+            index.postings = dict(index.postings)
+            self._fields[field] = index
+        self._names = {
+            field: [names for names, _ in field_bags] for field, field_bags in bags.items()
+        }
+        self._idf = idf
+        # Tokens naming a glass, finish or add-on; product features mention
+        # these ("Low-E glass option"), so they must not sway the product.
+        self._option_tokens = frozenset(
+            token for field in ("glass", "finish", "addon") for names in self._names[field] for token in names
+        )
+        self._default_glass = DEFAULT_GLASS_ID if DEFAULT_GLASS_ID in catalogue.glass_index else catalogue.default_glass["id"]
+        self._default_finish = DEFAULT_FINISH_ID if DEFAULT_FINISH_ID in catalogue.finish_index else catalogue.default_finish["id"]
+
+    @staticmethod
+    def _bag(name: str, text: list[str]) -> tuple[frozenset[str], dict[str, float]]:
+        names = frozenset(tokenize(name))
+        weights: dict[str, float] = {}
+        for token in (t for line in text for t in tokenize(line)):
+            weights[token] = TEXT_WEIGHT
+        for token in names:
+            weights[token] = NAME_WEIGHT
+        return names, weights
+
+    def _rank(self, field: str, tokens: set[str], allowed=None) -> list[tuple[float, float, int]]:
+        """
+        ``(fit, coverage, position)`` for every entry sharing a token, best
+        first. ``coverage`` is the share of the entry's name in the row;
+        ``fit`` is the token score scaled by it, so a row naming all of a
+        short name beats one naming part of a longer name.
+        """
+        index = self._fields[field]
+        scores: dict[int, float] = defaultdict(float)
+        for token in tokens:
+            for position, weight in index.postings.get(token, {}).items():
+                if allowed is None or allowed(index.ids[position]):
+                    scores[position] += weight
+        names = self._names[field]
+        ranked = []
+        for position, score in scores.items():
+            covered = sum(NAME_WEIGHT * self._idf[t] for t in names[position] & tokens)
+            total = index.name_weight[position]
+            coverage = covered / total if total else 0.0
+            ranked.append((score * coverage, coverage, position))
+        ranked.sort(key=lambda r: (-r[0], r[2]))
+        return ranked
+
+    def _pick(self, field: str, ranked: list[tuple[float, float, int]]) -> tuple[str | None, float]:
+        if not ranked or ranked[0][1] < MIN_COVERAGE:
+            return None, 0.0
+        fit, coverage, position = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+        margin = (fit - runner_up) / fit
+        return self._fields[field].ids[position], round(0.5 * coverage + 0.5 * margin, 3)
+
+    def _rank_products(self, tokens: set[str], allowed, dimensions) -> list[tuple[float, float, int]]:
+        """Product ranking, with each fit scaled by how well the row's dimensions suit the product."""
+        ranked = self._rank("product", tokens, allowed)
+        if dimensions is None or not ranked:
+            return ranked
+        sizes = self._sizes
+        adjusted = []
+        for fit, coverage, position in ranked:
+            size = sizes.match(*dimensions, product_id=self._fields["product"].ids[position])
+            adjusted.append((fit * (0.5 + 0.5 * (size.score if size else 0.0)), coverage, position))
+        adjusted.sort(key=lambda r: (-r[0], r[2]))
+        return adjusted
+
+    def match(self, text: str) -> dict:
+        """Catalogue selections for one schedule row (see module docstring)."""
+        cached = self._cache.get(text)
+        if cached is not None:
+            return _copy(cached)
+
+        tokens = set(tokenize(text))
+        code = _SCHEDULE_CODE.match(text)
+        category = {"W": "windows", "D": "doors"}[code.group(1).upper()] if code else None
+        allowed = (lambda pid: self._categories[pid] == category) if category else None
+
+        dimensions = parse_dimensions(text)
+
+        product_id, product_confidence = self._pick(
+            "product", self._rank_products(tokens - self._option_tokens, allowed, dimensions)
+        )
+        glass_id, glass_confidence = self._pick("glass", self._rank("glass", tokens))
+        finish_id, finish_confidence = self._pick("finish", self._rank("finish", tokens))
+
+        applicable = self.catalogue.applicable_addons.get(product_id) if product_id else None
+        addons = {}
+        for fit, coverage, position in self._rank("addon", tokens):
+            addon_id = self._fields["addon"].ids[position]
+            if coverage > ADDON_COVERAGE and (applicable is None or addon_id in applicable):
+                addons[addon_id] = round(coverage, 3)
+
+        result = {
+            "text": text,
+            "product_id": product_id,
+            "size_index": None,
+            "glass_id": glass_id or self._default_glass,
+            "finish_id": finish_id or self._default_finish,
+            "addon_ids": sorted(addons, key=self.catalogue.addon_index.get),
+            "confidence": {
+                "product": product_confidence,
+                "size": 0.0,
+                "glass": glass_confidence,
+                "finish": finish_confidence,
+                "addons": addons,
+            },
+        }
+        if product_id and dimensions:
+            size = self._sizes.match(*dimensions, product_id=product_id)
+            if size is not None:
+                result["size_index"] = size.size_index
+                result["confidence"]["size"] = round(size.score, 3)
+
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[text] = result
+        return _copy(result)
+
+    def match_many(self, rows: list) -> list[dict]:
+        """
+        Match a whole schedule in one call.
+
+        Rows are strings or dicts with a ``text`` key; any other keys (e.g.
+        ``quantity``) are carried through to the result.
+        """
+        results = []
+        for row in rows:
+            if isinstance(row, str):
+                results.append(self.match(row))
+            else:
+                extra = {k: v for k, v in row.items() if k != "text"}
+                results.append({**self.match(str(row.get("text", ""))), **extra})
+        return results
+
+
+_index: TextIndex | None = None
+
+
+def get_text_index() -> TextIndex:
+    """Text index for the current catalogue, rebuilt when its version changes."""
+    global _index
+    catalogue = get_catalogue()
+    index = _index
+    if index is None or index.version != catalogue.version:
+        index = TextIndex(catalogue)
+        _index = index
+    return index
+
+
+def match_schedule(rows: list) -> list[dict]:
+    """Batch-match schedule rows against the current catalogue (see ``TextIndex.match_many``)."""
+    return get_text_index().match_many(rows)
@@ -0,0 +1,254 @@
+"""
+Streaming ingestion of uploaded schedule documents.
+
+Architectural PDF sets run to hundreds of megabytes, so an upload is never
+held in memory. The multipart body is parsed as it arrives. The file part
+is collected into fixed-size blocks, and each block is hashed and written
+to a spooled temp file off the event loop. The request is rejected with
+413 as soon as ``Content-Length`` or the bytes received so far exceed the
+limit.
+
+The stored document is handed to extraction as a read-only memory-mapped
+view (or a view of the in-memory spool for small files). Pages can then be
+scanned in place without copying the file.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import tempfile
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+# Default cap on one uploaded document (WD_UPLOAD_MAX_BYTES).
+MAX_UPLOAD_BYTES = 250 * 1024 * 1024
+
+# Size of the blocks handed to the writer thread.
+BLOCK_SIZE = 1024 * 1024
+
+# Uploads up to this size stay in memory.
+SPOOL_BYTES = 1024 * 1024
+
+# Limit on each plain form field sent alongside the file.
+MAX_FIELD_BYTES = 64 * 1024
+
+# Multipart boundaries and part headers on top of the file itself.
+_ENVELOPE_BYTES = 64 * 1024
+
+
+class UploadError(Exception):
+    """Rejected upload; ``status_code`` is the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def max_upload_bytes() -> int:
+    return int(os.environ.get("WD_UPLOAD_MAX_BYTES", MAX_UPLOAD_BYTES))
+
+
+def _too_large(limit: int) -> str:
+    # Whole megabytes where the limit is one, exact bytes otherwise.
+    size = f"{limit // 2**20} MB" if limit >= 2**20 and limit % 2**20 == 0 else f"{limit:,}-byte"
+    return f"Document exceeds the {size} upload limit"
+
+
+class SpooledDocument:
+    """
+    Upload bytes kept in memory up to ``spool_bytes``, then in an unnamed
+    temp file, with a running SHA-256 of everything written.
+    """
+
+    def __init__(self, spool_bytes: int = SPOOL_BYTES) -> None:
+        self.spool_bytes = spool_bytes
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._memory: bytearray | None = bytearray()
+        self._file = None
+        self._map: mmap.mmap | None = None
+
+    @property
+    def digest(self) -> str:
+        return self._sha256.hexdigest()
+
+    def write(self, block: bytes) -> None:
+        self._sha256.update(block)
+        self.size += len(block)
+        if self._memory is not None:
+            if len(self._memory) + len(block) <= self.spool_bytes:
+                self._memory += block
+                return
+            self._file = tempfile.TemporaryFile(dir=os.environ.get("WD_UPLOAD_DIR"))
+            self._file.write(self._memory)
+            self._memory = None
+        self._file.write(block)
+
+    def view(self) -> memoryview:
+        """Read-only view of the whole document; valid until ``close``."""
+        if self._memory is not None:
+            return memoryview(self._memory).toreadonly()
+        self._file.flush()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._memory = None
+
+
+class Upload:
+    """A received document plus the form fields sent with it."""
+
+    def __init__(self, filename: str, content_type: str, document: SpooledDocument, fields: dict[str, str]) -> None:
+        self.filename = filename
+        self.content_type = content_type
+        self.document = document
+        self.fields = fields
+
+    @property
+    def digest(self) -> str:
+        return self.document.digest
+
+    @property
+    def size(self) -> int:
+        return self.document.size
+
+    def close(self) -> None:
+        self.document.close()
+
+
+class _PartCollector:
+    """``MultipartParser`` callbacks: the file goes to a ``SpooledDocument``, fields to a dict."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.document = SpooledDocument()
+        self.fields: dict[str, str] = {}
+        self.filename: str | None = None
+        self.content_type = "application/octet-stream"
+        # Set once the closing boundary has been parsed.
+        self.complete = False
+        # Parsed file bytes not yet handed to the writer thread.
+        self.pending = bytearray()
+        self._headers: dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+        self._name: str | None = None
+        self._is_file = False
+        self._text = bytearray()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_end": self.on_end,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._text = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field = b""
+        self._value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        self._is_file = filename is not None
+        if self._is_file:
+            if self.filename is not None:
+                raise UploadError(400, "Only one document may be uploaded at a time")
+            self.filename = os.path.basename(filename.decode("utf-8", "replace")) or "upload"
+            self.content_type = self._headers.get(b"content-type", b"application/octet-stream").decode("latin-1")
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._is_file:
+            self.pending += data[start:end]
+            if self.document.size + len(self.pending) > self.limit:
+                raise UploadError(413, _too_large(self.limit))
+        else:
+            self._text += data[start:end]
+            if len(self._text) > MAX_FIELD_BYTES:
+                raise UploadError(413, f"Form field {self._name!r} is too large")
+
+    def on_part_end(self) -> None:
+        if not self._is_file:
+            self.fields[self._name] = self._text.decode("utf-8", "replace")
+
+    def on_end(self) -> None:
+        self.complete = True
+
+
+async def receive_upload(request, limit: int | None = None) -> Upload:
+    """
+    Stream a ``multipart/form-data`` request into an ``Upload``.
+
+    Raises ``UploadError`` for a missing, empty or oversized document or a
+    malformed or truncated body. The caller must ``close()`` the returned upload.
+    """
+    limit = max_upload_bytes() if limit is None else limit
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise UploadError(415, "Expected a multipart/form-data upload")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit + _ENVELOPE_BYTES:
+        raise UploadError(413, _too_large(limit))
+
+    collector = _PartCollector(limit)
+    parser = MultipartParser(options[b"boundary"], collector.callbacks())
+    document = collector.document
+    try:
+        async for chunk in request.stream():
+            # Servers usually deliver small chunks; split big ones so at most
+            # about two blocks of file data are ever buffered.
+            for offset in range(0, len(chunk), BLOCK_SIZE):
+                try:
+                    parser.write(chunk[offset:offset + BLOCK_SIZE])
+                except UploadError:
+                    raise
+                except Exception as exc:
+                    raise UploadError(400, f"Malformed multipart body: {exc}") from exc
+                if len(collector.pending) >= BLOCK_SIZE:
+                    block = bytes(collector.pending)
+                    collector.pending.clear()
+                    await run_in_threadpool(document.write, block)
+        parser.finalize()
+        # finalize() accepts a body cut off mid-part; a partial document
+        # must not be extracted and cached under its digest.
+        if not collector.complete:
+            raise UploadError(400, "Upload ended before the closing multipart boundary")
+        if collector.pending:
+            await run_in_threadpool(document.write, bytes(collector.pending))
+            collector.pending.clear()
+        if collector.filename is None:
+            raise UploadError(400, "No document in the upload")
+        if document.size == 0:
+            raise UploadError(400, "Uploaded document is empty")
+    except BaseException:
+        document.close()
+        raise
+    return Upload(collector.filename, collector.content_type, document, collector.fields)
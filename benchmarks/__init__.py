@@ -0,0 +1 @@
+"""Offline benchmark and load-test tooling for the W-D Estimating Agent."""
@@ -0,0 +1,93 @@
+"""
+Minimal in-process ASGI client.
+
+Drives the FastAPI app directly through its ASGI interface so benchmarks
+measure the application, not a network stack, and run with no server and
+no extra dependencies.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json as jsonlib
+
+
+class ASGIResponse:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: dict[str, str], body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return jsonlib.loads(self.body)
+
+
+class ASGIClient:
+    """Send HTTP requests to an ASGI app without a network."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json=None,
+        body: bytes = b"",
+        headers: dict[str, str] | None = None,
+    ) -> ASGIResponse:
+        path, _, query = path.partition("?")
+        request_headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()]
+        if json is not None:
+            body = jsonlib.dumps(json).encode("utf-8")
+            request_headers.append((b"content-type", b"application/json"))
+        request_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.4"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"),
+            "root_path": "",
+            "headers": request_headers,
+            "server": ("testserver", 80),
+            "client": ("127.0.0.1", 50000),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        disconnected = asyncio.Event()
+        status = 500
+        response_headers: dict[str, str] = {}
+        chunks: list[bytes] = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for key, value in message.get("headers", []):
+                    response_headers[key.decode("latin-1")] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            disconnected.set()
+        return ASGIResponse(status, response_headers, b"".join(chunks))
+
+    def get(self, path: str, **kwargs) -> ASGIResponse:
+        return asyncio.run(self.request("GET", path, **kwargs))
+
+    def post(self, path: str, **kwargs) -> ASGIResponse:
+        return asyncio.run(self.request("POST", path, **kwargs))
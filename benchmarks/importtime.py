@@ -0,0 +1,98 @@
+"""
+Import-time profile of the serverless entry point.
+
+Runs ``python -X importtime -c "import api.index"`` in a fresh interpreter
+(lazy startup, as on Vercel) and summarises the cost: total, the slowest
+modules by cumulative time, and every ``app.*`` module. The committed
+``benchmarks/importtime.txt`` is the reference report; regenerate it after
+changing what the app imports at startup:
+
+    python -m benchmarks.importtime -o benchmarks/importtime.txt
+
+Times vary between machines and runs, so compare shapes and proportions
+rather than absolute numbers; ``--runs`` takes the median of several.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def profile_once(module: str, env: dict) -> dict[str, tuple[int, int, int]]:
+    """``{module: (self_us, cumulative_us, depth)}`` for one cold import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        timings[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return timings
+
+
+def profile(module: str, runs: int, startup: str) -> dict[str, tuple[int, int, int]]:
+    env = dict(os.environ, WD_STARTUP=startup)
+    samples = [profile_once(module, env) for _ in range(runs)]
+    merged = {}
+    for name in samples[0]:
+        values = [s[name] for s in samples if name in s]
+        merged[name] = (
+            int(statistics.median(v[0] for v in values)),
+            int(statistics.median(v[1] for v in values)),
+            values[0][2],
+        )
+    return merged
+
+
+def report(module: str, timings: dict, top: int, runs: int, startup: str) -> str:
+    total = timings[module][1]
+    by_cumulative = sorted(timings.items(), key=lambda kv: kv[1][1], reverse=True)
+    lines = [
+        f"Import-time profile: import {module}  (WD_STARTUP={startup}, median of {runs} run(s))",
+        f"Python {sys.version.split()[0]}, {len(timings)} modules, total {total / 1000:.1f} ms",
+        "",
+        f"Slowest {top} modules by cumulative time:",
+        f"{'cumulative ms':>14} {'self ms':>9}  module",
+    ]
+    for name, (self_us, cumulative_us, depth) in by_cumulative[:top]:
+        lines.append(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {'  ' * depth}{name}")
+    lines += ["", "Application modules:", f"{'cumulative ms':>14} {'self ms':>9}  module"]
+    for name, (self_us, cumulative_us, _) in sorted(timings.items()):
+        if name == "app" or name.startswith(("app.", "api.")):
+            lines.append(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    return "\n".join(lines) + "\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="api.index")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--startup", choices=("lazy", "eager"), default="lazy")
+    parser.add_argument("-o", "--output", help="write the report here instead of stdout")
+    args = parser.parse_args()
+
+    text = report(args.module, profile(args.module, args.runs, args.startup), args.top, args.runs, args.startup)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Offline load test for the HTTP API and pages.
+
+Drives the FastAPI app in-process through ``benchmarks.asgi`` (no server,
+no network) for ``--duration`` seconds per target:
+
+- ``quote``: ``POST /api/quote`` with synthetic schedules from
+  ``benchmarks.schedules`` (a pool of distinct seeded schedules);
+- ``takeoff``: ``POST /api/takeoff`` over ``--takeoff-files`` filenames, so
+  the takeoff cache sees misses and then hits;
+- ``pages``: ``GET /``, ``/quote``, ``/upload`` and ``/result`` in turn.
+
+By default ``--concurrency`` clients send back to back (closed loop), which
+finds the sustained requests per second. A client only sends once its last
+response is in, so time a request would have spent queued behind one that
+blocked the event loop is never counted. Give ``--rate`` to send that many
+requests per second on a fixed schedule instead (open loop, at most
+``--concurrency`` in flight) with latency measured from when each request
+was due: the latency to expect at that load.
+
+Each target reports requests per second, p50/p90/p99/max latency, status
+codes, and resident memory before and after (``--tracemalloc`` adds Python
+heap growth, at some cost to throughput).
+
+Quotes, the quote number sequence and the takeoff cache go to a temporary
+directory unless ``WD_QUOTE_DB``, ``WD_QUOTE_SEQ_DB`` or
+``WD_TAKEOFF_CACHE_DIR`` are set. Double-submit replay is off
+(``WD_DEDUP_WINDOW=0``) unless set, so requests that cycle through the same
+bodies still reach the handlers.
+
+    python -m benchmarks.loadtest                                   # all targets, 10s each
+    python -m benchmarks.loadtest --targets quote --lines 2000 --concurrency 32
+    python -m benchmarks.loadtest --targets pages --rate 200        # latency at 200 req/s
+    python -m benchmarks.loadtest --duration 30 --output load.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from itertools import cycle
+from pathlib import Path
+
+from benchmarks.run import percentile
+from benchmarks.schedules import generate_schedule
+
+TARGETS = ("quote", "takeoff", "pages")
+PAGES = ("/", "/quote", "/upload", "/result")
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def build_requests(target: str, args) -> list[tuple[str, str, dict]]:
+    """The requests one target cycles through, as ``(method, path, kwargs)``."""
+    if target == "quote":
+        return [
+            ("POST", "/api/quote", {"json": {
+                "client_name": f"Load Client {seed}",
+                "project_address": f"{seed} Load St",
+                "items": generate_schedule(args.lines, seed, args.repetition, args.size_skew),
+            }})
+            for seed in range(args.seed, args.seed + args.schedules)
+        ]
+    if target == "takeoff":
+        return [
+            ("POST", "/api/takeoff", {"json": {"filename": f"load-schedule-{i}.pdf"}})
+            for i in range(args.takeoff_files)
+        ]
+    if target == "pages":
+        return [("GET", path, {}) for path in PAGES]
+    raise ValueError(f"Unknown target: {target}")
+
+
+async def drive(
+    client,
+    requests: list,
+    concurrency: int,
+    duration: float,
+    rate: float = 0.0,
+) -> tuple[list[float], Counter, float]:
+    """
+    Send ``requests`` in turn for ``duration`` seconds: from ``concurrency``
+    closed-loop clients, or at ``rate`` per second if given. Latencies are
+    in seconds.
+    """
+    pending = cycle(requests)
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def send(request, due: float) -> None:
+        method, path, kwargs = request
+        response = await client.request(method, path, **kwargs)
+        latencies.append(time.perf_counter() - due)
+        statuses[response.status] += 1
+
+    if rate <= 0:
+        async def worker():
+            while time.perf_counter() < deadline:
+                await send(next(pending), time.perf_counter())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    else:
+        slots = asyncio.Semaphore(concurrency)
+
+        async def scheduled(request, due: float) -> None:
+            async with slots:
+                await send(request, due)
+
+        tasks = []
+        for n in range(int(duration * rate)):
+            due = started + n / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(scheduled(next(pending), due)))
+        await asyncio.gather(*tasks)
+    return latencies, statuses, time.perf_counter() - started
+
+
+def run_target(loop, client, target: str, args) -> dict:
+    requests = build_requests(target, args)
+    if args.warmup:
+        loop.run_until_complete(drive(client, requests, args.concurrency, args.warmup, args.rate))
+    gc.collect()
+    rss_before = rss_bytes()
+    if args.tracemalloc:
+        tracemalloc.start()
+    try:
+        latencies, statuses, elapsed = loop.run_until_complete(
+            drive(client, requests, args.concurrency, args.duration, args.rate)
+        )
+        gc.collect()
+        heap_growth = tracemalloc.get_traced_memory()[0] if args.tracemalloc else None
+    finally:
+        tracemalloc.stop()
+    rss_after = rss_bytes()
+
+    latencies.sort()
+    ok = sum(n for status, n in statuses.items() if status < 400)
+    return {
+        "requests": len(latencies),
+        "ok": ok,
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+        "requests_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        "rss_before_mib": rss_before / 2**20,
+        "rss_after_mib": rss_after / 2**20,
+        "rss_growth_mib": (rss_after - rss_before) / 2**20,
+        "heap_growth_mib": None if heap_growth is None else heap_growth / 2**20,
+    }
+
+
+def print_table(results: dict) -> None:
+    print(
+        f"{'target':<10} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+        f"{'max ms':>9} {'RSS MiB':>9} {'growth':>8} {'heap':>8}  statuses"
+    )
+    for name, r in results["targets"].items():
+        statuses = " ".join(f"{status}:{n}" for status, n in r["statuses"].items())
+        heap = "-" if r["heap_growth_mib"] is None else f"{r['heap_growth_mib']:+.1f}"
+        print(
+            f"{name:<10} {r['requests']:>9,} {r['requests_per_s']:>9,.1f} {r['p50_ms']:>9.2f} {r['p90_ms']:>9.2f} "
+            f"{r['p99_ms']:>9.2f} {r['max_ms']:>9.2f} {r['rss_after_mib']:>9.1f} {r['rss_growth_mib']:>+8.1f} {heap:>8}  {statuses}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"comma-separated, from {', '.join(TARGETS)}")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients sending at once (most in flight with --rate)")
+    parser.add_argument("--rate", type=float, default=0.0, help="requests/s on a fixed schedule (default: closed loop)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per target")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds per target before measuring")
+    parser.add_argument("--lines", type=int, default=100, help="lines per quote")
+    parser.add_argument("--schedules", type=int, default=32,
+                        help="distinct quote schedules to cycle through (at least --concurrency, or identical "
+                             "requests in flight are coalesced)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repetition", type=float, default=0.8)
+    parser.add_argument("--size-skew", type=float, default=0.0)
+    parser.add_argument("--takeoff-files", type=int, default=100, help="distinct takeoff filenames")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report Python heap growth")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    targets = [t for t in args.targets.split(",") if t]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix="wd-load-") as tmp:
+        os.environ.setdefault("WD_QUOTE_DB", os.path.join(tmp, "quotes.sqlite3"))
+        os.environ.setdefault("WD_QUOTE_SEQ_DB", os.path.join(tmp, "sequence.sqlite3"))
+        os.environ.setdefault("WD_TAKEOFF_CACHE_DIR", os.path.join(tmp, "takeoff-cache"))
+        os.environ.setdefault("WD_DEDUP_WINDOW", "0")
+
+        from benchmarks.asgi import ASGIClient
+
+        from app.catalogue import get_catalogue
+        from app.main import app
+
+        client = ASGIClient(app)
+        # One loop for every target: the app's limiters bind to the loop they first run on.
+        loop = asyncio.new_event_loop()
+        try:
+            measured = {target: run_target(loop, client, target, args) for target in targets}
+        finally:
+            loop.close()
+        results = {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "catalogue_version": get_catalogue().version,
+            "concurrency": args.concurrency,
+            "rate": args.rate or None,
+            "duration_s": args.duration,
+            "lines": args.lines,
+            "targets": measured,
+        }
+    print_table(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
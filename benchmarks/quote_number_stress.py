@@ -0,0 +1,60 @@
+"""
+Stress test for the quote number allocator.
+
+Many processes, each running several threads, allocate quote numbers from
+one shared counter file; the run fails if any number is issued twice.
+
+    python -m benchmarks.quote_number_stress --processes 8 --threads 8 --count 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.quote_numbers import QuoteNumberAllocator
+
+
+def _worker(path: str, threads: int, count: int, block_size: int) -> list[str]:
+    # No instance tag: uniqueness must come from the shared counter alone.
+    allocator = QuoteNumberAllocator(path, block_size=block_size, instance="")
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        batches = pool.map(lambda _: [allocator.allocate() for _ in range(count)], range(threads))
+        return [number for batch in batches for number in batch]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Check quote numbers stay unique under concurrency.")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=8, help="threads per process")
+    parser.add_argument("--count", type=int, default=2000, help="numbers per thread")
+    parser.add_argument("--block-size", type=int, default=16, help="small blocks stress the shared counter")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sequence.sqlite3")
+        QuoteNumberAllocator(path, instance="")  # create the schema before the workers race for it
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.starmap(
+                _worker,
+                [(path, args.threads, args.count, args.block_size)] * args.processes,
+            )
+        elapsed = time.perf_counter() - started
+
+    numbers = [number for result in results for number in result]
+    duplicates = len(numbers) - len(set(numbers))
+    print(
+        f"{len(numbers):,} numbers from {args.processes} processes x {args.threads} threads "
+        f"in {elapsed:.2f}s ({len(numbers) / elapsed:,.0f}/s); duplicates: {duplicates}"
+    )
+    return 1 if duplicates else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Benchmark suite for the estimator and the HTTP endpoints.
+
+Runs entirely offline: the estimator is called directly and the FastAPI
+app is driven in-process through ``benchmarks.asgi``. Each case reports
+throughput, p50/p99 latency and the peak Python heap allocated by one call.
+
+    python -m benchmarks.run                         # full run
+    python -m benchmarks.run --sizes 10,1000         # quick run
+    python -m benchmarks.run --save-baseline         # record benchmarks/baseline.json
+    python -m benchmarks.run --compare               # exit 1 on regressions vs baseline
+
+Schedules repeat ``SAMPLE_TAKEOFF_RESULTS`` so large quotes have the same
+configuration mix as a real takeoff.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from itertools import cycle, islice
+from pathlib import Path
+
+from app.catalogue import get_catalogue
+from app.estimator import SAMPLE_TAKEOFF_RESULTS, calculate_line_item, generate_quote
+
+DEFAULT_SIZES = (10, 1_000, 100_000, 1_000_000)
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+
+def schedule(lines: int) -> list[dict]:
+    """A schedule of ``lines`` items cycling through the sample takeoff."""
+    return list(islice(cycle(SAMPLE_TAKEOFF_RESULTS), lines))
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def measure(fn, units: int = 1, min_time: float = 0.5, min_iter: int = 3, max_iter: int = 100_000) -> dict:
+    """Time repeated calls of ``fn``; ``units`` is the work done per call."""
+    fn()  # warm-up
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_iter and (len(timings) < min_iter or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    p50 = statistics.median(timings)
+    return {
+        "iterations": len(timings),
+        "units_per_call": units,
+        "throughput_per_s": units / p50 if p50 else 0.0,
+        "p50_ms": p50 * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+def estimator_cases(sizes) -> dict:
+    results = {}
+    catalogue = get_catalogue()
+    ids = (
+        [("product", p["id"]) for p in catalogue.products]
+        + [("glass", g["id"]) for g in catalogue.glass_options]
+        + [("finish", f["id"]) for f in catalogue.finish_options]
+        + [("addon", a["id"]) for a in catalogue.addon_options]
+    )
+    getters = {
+        "product": catalogue.get_product,
+        "glass": catalogue.get_glass,
+        "finish": catalogue.get_finish,
+        "addon": catalogue.get_addon,
+    }
+    lookups = [(getters[kind], key) for kind, key in ids]
+
+    def lookup_all():
+        for getter, key in lookups:
+            getter(key)
+
+    results["catalogue_lookup"] = measure(lookup_all, units=len(lookups))
+
+    sample = SAMPLE_TAKEOFF_RESULTS
+
+    def price_sample():
+        for item in sample:
+            calculate_line_item(
+                product_id=item["product_id"],
+                size_index=item["size_index"],
+                quantity=item["quantity"],
+                glass_id=item["glass_id"],
+                finish_id=item["finish_id"],
+                addon_ids=item["addon_ids"],
+            )
+
+    results["calculate_line_item"] = measure(price_sample, units=len(sample))
+
+    for size in sizes:
+        items = schedule(size)
+        results[f"generate_quote[{size}]"] = measure(
+            lambda items=items: generate_quote("Bench Client", "1 Bench St", items),
+            units=size,
+            min_iter=3 if size <= 100_000 else 1,
+        )
+    return results
+
+
+def http_cases() -> dict:
+    from benchmarks.asgi import ASGIClient
+
+    from app.main import app
+
+    client = ASGIClient(app)
+    loop = asyncio.new_event_loop()
+    payload = {
+        "client_name": "Bench Client",
+        "project_address": "1 Bench St",
+        "items": schedule(100),
+    }
+    requests = {
+        "POST /api/quote[100]": ("POST", "/api/quote", {"json": payload}),
+        "GET /api/products": ("GET", "/api/products", {}),
+        "GET /": ("GET", "/", {}),
+        "GET /quote": ("GET", "/quote", {}),
+        "GET /upload": ("GET", "/upload", {}),
+        "GET /result": ("GET", "/result", {}),
+    }
+    results = {}
+    try:
+        for name, (method, path, kwargs) in requests.items():
+            def call(method=method, path=path, kwargs=kwargs):
+                response = loop.run_until_complete(client.request(method, path, **kwargs))
+                if response.status != 200:
+                    raise RuntimeError(f"{name} returned {response.status}")
+
+            results[name] = measure(call)
+    finally:
+        loop.close()
+    return results
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Cases whose p50 got slower than baseline by more than ``tolerance``."""
+    regressions = []
+    for name, result in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if not base or not base["p50_ms"]:
+            continue
+        ratio = result["p50_ms"] / base["p50_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: p50 {base['p50_ms']:.3f}ms -> {result['p50_ms']:.3f}ms (x{ratio:.2f})")
+    return regressions
+
+
+def print_table(results: dict) -> None:
+    print(f"{'case':<28} {'iters':>7} {'throughput/s':>14} {'p50 ms':>10} {'p99 ms':>10} {'peak KiB':>10}")
+    for name, r in results["cases"].items():
+        print(
+            f"{name:<28} {r['iterations']:>7} {r['throughput_per_s']:>14,.0f} "
+            f"{r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['peak_kib']:>10,.0f}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma-separated generate_quote line counts")
+    parser.add_argument("--skip-http", action="store_true", help="only benchmark the estimator")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write results to --baseline")
+    parser.add_argument("--compare", action="store_true", help="compare against --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed p50 slowdown before a case counts as a regression")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    cases = estimator_cases(sizes)
+    if not args.skip_http:
+        cases.update(http_cases())
+
+    results = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "catalogue_version": get_catalogue().version,
+        "cases": cases,
+    }
+    print_table(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nBaseline written to {args.baseline}")
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"\nNo baseline at {args.baseline}; run with --save-baseline first.")
+            return 1
+        baseline = json.loads(args.baseline.read_text())
+        for key in ("python", "platform"):
+            if baseline.get(key) != results[key]:
+                print(f"\nNote: baseline {key} is {baseline.get(key)}, this run is {results[key]}.")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
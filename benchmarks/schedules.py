@@ -0,0 +1,154 @@
+"""
+Seeded synthetic window and door schedules.
+
+``SAMPLE_TAKEOFF_RESULTS`` has seven rows, too few to capacity-plan with.
+``generate_schedule`` draws any number of lines from the real catalogue
+(``WINDOW_TYPES`` and ``DOOR_TYPES`` sizes, glass, finishes and add-ons),
+weighted by how the sample takeoff uses them:
+
+- windows and doors, glass, finish and quantity follow the sample's mix,
+  smoothed so every catalogue option still turns up;
+- each add-on applies with its sample rate for the line's category;
+- ``size_skew`` tilts size choice: 0 is uniform, positive favours small
+  openings, negative large ones;
+- ``repetition`` is the chance a line repeats an earlier line, the way a
+  real schedule lists W01 on every floor. Common types become more common,
+  so a few types cover most openings.
+
+The same seed always gives the same schedule.
+
+    python -m benchmarks.schedules --lines 1000 --seed 7 > schedule.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+from collections import Counter
+from itertools import accumulate
+
+from app.catalogue import Catalogue, get_catalogue
+from app.estimator import SAMPLE_TAKEOFF_RESULTS
+
+# Weight added to every option, so those the sample never uses still appear.
+SMOOTHING = 0.5
+
+
+def _cumulative(weights) -> list[float]:
+    return list(accumulate(weights))
+
+
+class ScheduleModel:
+    """Choice weights for synthetic lines, fitted to a sample takeoff."""
+
+    def __init__(
+        self,
+        catalogue: Catalogue,
+        size_skew: float = 0.0,
+        sample: list[dict] = SAMPLE_TAKEOFF_RESULTS,
+    ) -> None:
+        products = {p["id"]: p for p in catalogue.products}
+        categories = sorted({p["category"] for p in catalogue.products})
+        used = Counter(products[item["product_id"]]["category"] for item in sample)
+
+        self.categories = categories
+        self.category_weights = _cumulative(used[c] + SMOOTHING for c in categories)
+        self.products = {c: [p for p in catalogue.products if p["category"] == c] for c in categories}
+        product_use = Counter(item["product_id"] for item in sample)
+        self.product_weights = {
+            c: _cumulative(product_use[p["id"]] + SMOOTHING for p in self.products[c]) for c in categories
+        }
+        self.size_weights = {
+            p["id"]: _cumulative((i + 1) ** -size_skew for i in range(len(p["sizes"])))
+            for p in catalogue.products
+        }
+
+        # Glass and finish are weighted by openings (quantity), not rows.
+        glass_use = Counter()
+        finish_use = Counter()
+        for item in sample:
+            glass_use[item["glass_id"]] += item["quantity"]
+            finish_use[item["finish_id"]] += item["quantity"]
+        self.glass_ids = [g["id"] for g in catalogue.glass_options]
+        self.glass_weights = _cumulative(glass_use[g] + SMOOTHING for g in self.glass_ids)
+        self.finish_ids = [f["id"] for f in catalogue.finish_options]
+        self.finish_weights = _cumulative(finish_use[f] + SMOOTHING for f in self.finish_ids)
+
+        self.quantities: dict[str, list[int]] = {}
+        self.addon_rates: dict[str, list[tuple[str, float]]] = {}
+        for category in categories:
+            rows = [item for item in sample if products[item["product_id"]]["category"] == category]
+            self.quantities[category] = [item["quantity"] for item in rows] or [1]
+            self.addon_rates[category] = [
+                (
+                    addon["id"],
+                    (sum(addon["id"] in item["addon_ids"] for item in rows) + SMOOTHING) / (len(rows) + 2 * SMOOTHING),
+                )
+                for addon in catalogue.addon_options
+                if category in addon["applies_to"]
+            ]
+
+    def line(self, rng: random.Random) -> tuple[str, dict, str]:
+        """A new opening type: its category, line item and description."""
+        category = rng.choices(self.categories, cum_weights=self.category_weights)[0]
+        product = rng.choices(self.products[category], cum_weights=self.product_weights[category])[0]
+        sizes = product["sizes"]
+        size_index = rng.choices(range(len(sizes)), cum_weights=self.size_weights[product["id"]])[0]
+        return category, {
+            "product_id": product["id"],
+            "size_index": size_index,
+            "quantity": rng.choice(self.quantities[category]),
+            "glass_id": rng.choices(self.glass_ids, cum_weights=self.glass_weights)[0],
+            "finish_id": rng.choices(self.finish_ids, cum_weights=self.finish_weights)[0],
+            "addon_ids": [addon_id for addon_id, rate in self.addon_rates[category] if rng.random() < rate],
+        }, f"{product['name']} {sizes[size_index]['label']}"
+
+
+def generate_schedule(
+    lines: int,
+    seed: int = 0,
+    repetition: float = 0.8,
+    size_skew: float = 0.0,
+    catalogue: Catalogue | None = None,
+) -> list[dict]:
+    """
+    ``lines`` schedule items drawn from the catalogue, reproducibly for
+    ``seed``. Items have the same shape as ``SAMPLE_TAKEOFF_RESULTS``.
+    """
+    if not 0 <= repetition <= 1:
+        raise ValueError("repetition must be between 0 and 1")
+    rng = random.Random(seed)
+    model = ScheduleModel(catalogue or get_catalogue(), size_skew)
+    items: list[dict] = []
+    marks = {"windows": "W", "doors": "D"}
+    counts: Counter = Counter()
+    for _ in range(lines):
+        if items and rng.random() < repetition:
+            item = dict(rng.choice(items))
+            item["addon_ids"] = list(item["addon_ids"])
+        else:
+            category, item, description = model.line(rng)
+            counts[category] += 1
+            mark = f"{marks.get(category, category[:1].upper())}{counts[category]:02d}"
+            item["extracted_note"] = f"{mark} — {description}"
+        items.append(item)
+    return items
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Write a synthetic schedule as JSON line items.")
+    parser.add_argument("--lines", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repetition", type=float, default=0.8, help="chance a line repeats an earlier one")
+    parser.add_argument("--size-skew", type=float, default=0.0, help=">0 favours small sizes, <0 large ones")
+    args = parser.parse_args(argv)
+    items = generate_schedule(args.lines, args.seed, args.repetition, args.size_skew)
+    json.dump(items, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())